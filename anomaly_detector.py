@@ -0,0 +1,198 @@
+import argparse
+import math
+import os
+
+import pandas as pd
+
+import data_store
+
+# One price series per premise and item (as in feature_store)
+SERIES_KEY = ['premise_code', 'item_code']
+
+# EWMA half-life, in observations of the series
+HALF_LIFE = 7
+
+# A price is flagged when it is this many standard deviations from the series' EWMA
+THRESHOLD = 3.0
+
+# Observations a series needs before its prices are scored
+MIN_HISTORY = 5
+
+# Floor for the standard deviation: prices are quoted to 10 sen, so flat series would
+# otherwise flag every 10 sen move
+MIN_STD = 0.05
+
+# State and log of the production detector (default half-life, maintained by ingest and the warm-up)
+ANOMALY_DIR = os.path.join(data_store.STORE_DIR, "anomalies")
+STATE_PATH = os.path.join(ANOMALY_DIR, "state.pkl")
+LOG_PATH = os.path.join(ANOMALY_DIR, "anomalies.pkl")
+
+# Context columns copied from the feed into the anomaly table when present
+CONTEXT_COLUMNS = ['premise', 'premise_type', 'district', 'item']
+
+# Per-series state: [count, mean, m2, ewma, ew_var, last_date]
+COUNT, MEAN, M2, EWMA, EW_VAR, LAST_DATE = range(6)
+
+
+# Weight of the newest observation for a half-life
+def ewma_alpha(half_life):
+    return 1 - 0.5 ** (1 / half_life)
+
+
+# Score one price against its series' state, then fold it into the state. O(1).
+# Returns (z against the running mean, z against the EWMA); NaN while the history is short.
+def update(entry, price, date, alpha):
+    n = entry[COUNT]
+    if n >= MIN_HISTORY:
+        std = max(math.sqrt(entry[M2] / (n - 1)), MIN_STD)
+        ew_std = max(math.sqrt(entry[EW_VAR]), MIN_STD)
+        z_mean = (price - entry[MEAN]) / std
+        z_ewma = (price - entry[EWMA]) / ew_std
+    else:
+        z_mean = z_ewma = math.nan
+
+    # Welford's running mean and sum of squared deviations
+    n += 1
+    delta = price - entry[MEAN]
+    entry[MEAN] += delta / n
+    entry[M2] += delta * (price - entry[MEAN])
+    entry[COUNT] = n
+
+    # Exponentially weighted mean and variance
+    if n == 1:
+        entry[EWMA], entry[EW_VAR] = price, 0.0
+    else:
+        diff = price - entry[EWMA]
+        increment = alpha * diff
+        entry[EWMA] += increment
+        entry[EW_VAR] = (1 - alpha) * (entry[EW_VAR] + diff * increment)
+    entry[LAST_DATE] = date
+    return z_mean, z_ewma
+
+
+# (state path, log path) for a half-life. Other half-lives keep their own checkpoint under
+# hl=<n>/, so trying one out never touches the production detector's state.
+def _paths(half_life=HALF_LIFE):
+    if half_life == HALF_LIFE:
+        return STATE_PATH, LOG_PATH
+    folder = os.path.join(ANOMALY_DIR, f"hl={half_life:g}")
+    return os.path.join(folder, "state.pkl"), os.path.join(folder, "anomalies.pkl")
+
+
+# Version of a detector's checkpoint (changes whenever it is updated), None before its first run
+def state_version(half_life=HALF_LIFE):
+    return data_store.data_version(_paths(half_life)[0])
+
+
+# Checkpointed state: series -> state list; empty if missing or built with another half-life
+def load_state(half_life=HALF_LIFE):
+    state_path = _paths(half_life)[0]
+    if os.path.exists(state_path):
+        table = pd.read_pickle(state_path)
+        if table.attrs.get('half_life') == half_life:
+            keys = zip(table['premise_code'], table['item_code'])
+            values = table[['count', 'mean', 'm2', 'ewma', 'ew_var', 'last_date']].itertuples(index=False)
+            return {key: list(value) for key, value in zip(keys, values)}
+    return {}
+
+
+def _write(frame, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = data_store.temp_path(path)
+    frame.to_pickle(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def save_state(state, half_life=HALF_LIFE):
+    table = pd.DataFrame(
+        [list(key) + value for key, value in state.items()],
+        columns=SERIES_KEY + ['count', 'mean', 'm2', 'ewma', 'ew_var', 'last_date']
+    )
+    table.attrs['half_life'] = half_life
+    _write(table, _paths(half_life)[0])
+
+
+# Every price flagged so far (None before anything was flagged)
+def load_log(half_life=HALF_LIFE):
+    log_path = _paths(half_life)[1]
+    if os.path.exists(log_path):
+        return pd.read_pickle(log_path)
+    return None
+
+
+# Score new prices in date order and update the checkpoint. Prices at or before a series'
+# last processed date were already seen (or arrived late) and are skipped.
+# Returns every scored row with its z-scores and whether it was flagged.
+def process(rows, half_life=HALF_LIFE, threshold=THRESHOLD):
+    state = load_state(half_life)
+    log_path = _paths(half_life)[1]
+    if not state and os.path.exists(log_path):
+        # The state was reset, so old flags no longer match it
+        os.remove(log_path)
+    alpha = ewma_alpha(half_life)
+
+    rows = rows.sort_values('date', kind='stable')
+    context = [col for col in CONTEXT_COLUMNS if col in rows.columns]
+    scored = []
+    for row in rows[SERIES_KEY + ['date', 'price'] + context].itertuples(index=False):
+        key = (row.premise_code, row.item_code)
+        entry = state.get(key)
+        if entry is None:
+            entry = state[key] = [0, 0.0, 0.0, 0.0, 0.0, None]
+        elif row.date <= entry[LAST_DATE]:
+            continue
+        expected = entry[EWMA]
+        z_mean, z_ewma = update(entry, float(row.price), row.date, alpha)
+        scored.append(tuple(row) + (expected, z_mean, z_ewma))
+
+    scored = pd.DataFrame(scored, columns=SERIES_KEY + ['date', 'price'] + context + ['expected', 'z_mean', 'z_ewma'])
+    scored['anomaly'] = scored['z_ewma'].abs() >= threshold
+
+    flagged = scored[scored['anomaly']]
+    if not flagged.empty:
+        log = load_log(half_life)
+        _write(pd.concat([log, flagged], ignore_index=True) if log is not None else flagged.reset_index(drop=True),
+               log_path)
+    save_state(state, half_life)
+    return scored
+
+
+# Process whatever part of the dataset the checkpoint has not seen yet (all of it on the first run)
+def catch_up(source=data_store.SOURCE, half_life=HALF_LIFE, threshold=THRESHOLD):
+    df = data_store.load(source)
+    state = load_state(half_life)
+    if state:
+        last = pd.DataFrame(
+            [list(key) + [entry[LAST_DATE]] for key, entry in state.items()],
+            columns=SERIES_KEY + ['last_date']
+        )
+        merged = df[SERIES_KEY + ['date']].merge(last, on=SERIES_KEY, how='left')
+        df = df[(merged['last_date'].isna() | (merged['date'] > merged['last_date'])).to_numpy()]
+    if df.empty:
+        return df.iloc[:0]
+    for col in df.select_dtypes('category').columns:
+        df[col] = df[col].astype(object)
+    return process(df, half_life, threshold)
+
+
+# Flagged prices, most unusual first
+def ranked(limit=None, threshold=THRESHOLD, half_life=HALF_LIFE):
+    log = load_log(half_life)
+    if log is None:
+        return pd.DataFrame(columns=SERIES_KEY + ['date', 'price', 'expected', 'z_mean', 'z_ewma'])
+    log = log[log['z_ewma'].abs() >= threshold]
+    log = log.reindex(log['z_ewma'].abs().sort_values(ascending=False).index).drop(columns='anomaly')
+    return log.reset_index(drop=True).head(limit) if limit is not None else log.reset_index(drop=True)
+
+
+# Example (daily, after ingest): python anomaly_detector.py --half-life 7
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score new egg prices against per-series online statistics")
+    parser.add_argument('--source', default=data_store.SOURCE)
+    parser.add_argument('--half-life', type=float, default=HALF_LIFE)
+    parser.add_argument('--threshold', type=float, default=THRESHOLD)
+    args = parser.parse_args()
+
+    result = catch_up(args.source, args.half_life, args.threshold)
+    print(f"Scored {len(result)} new prices, {int(result['anomaly'].sum()) if len(result) else 0} flagged")
+    print(ranked(limit=10, threshold=args.threshold, half_life=args.half_life).to_string(index=False))
@@ -0,0 +1,92 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import model_registry
+import prediction_table
+
+INPUT_COLUMNS = ['item_code', 'premise_type', 'district', 'month']
+
+# Rows scored per chunk; memory use is bounded by this, not by the file size
+CHUNK_SIZE = 50_000
+
+
+# Yield (chunk, fraction_done) from an uploaded CSV or Parquet file
+def read_chunks(file, file_name, chunksize=CHUNK_SIZE):
+    if file_name.lower().endswith('.parquet'):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("Reading Parquet files requires the 'pyarrow' package")
+        parquet_file = pq.ParquetFile(file)
+        total_rows = max(parquet_file.metadata.num_rows, 1)
+        rows_done = 0
+        for batch in parquet_file.iter_batches(batch_size=chunksize):
+            rows_done += batch.num_rows
+            yield batch.to_pandas(), rows_done / total_rows
+    else:
+        # Progress is estimated from how far the reader has moved through the file
+        file.seek(0, os.SEEK_END)
+        total_bytes = max(file.tell(), 1)
+        file.seek(0)
+        for chunk in pd.read_csv(file, chunksize=chunksize):
+            yield chunk, min(file.tell() / total_bytes, 1.0)
+
+
+# Raise if a required column is missing, then flag rows the pipelines cannot score.
+# Returns the problems per row and the inputs converted to the encoder's types.
+def validate(chunk, category_map):
+    missing_columns = [col for col in INPUT_COLUMNS if col not in chunk.columns]
+    if missing_columns:
+        raise ValueError(f"Missing required columns: {', '.join(missing_columns)}")
+
+    inputs = pd.DataFrame(index=chunk.index)
+    problems = pd.Series('', index=chunk.index)
+    for col, categories in category_map.items():
+        # Match on the string form so '118' in a file maps to the encoder's 118
+        lookup = {str(c): c for c in categories}
+        inputs[col] = chunk[col].astype(str).str.strip().map(lookup)
+        problems[inputs[col].isna()] += f"unknown {col}; "
+
+    inputs['month'] = pd.to_numeric(chunk['month'], errors='coerce')
+    problems[~inputs['month'].isin(range(1, 13))] += "month must be 1-12; "
+    return problems.str.rstrip('; '), inputs
+
+
+# Score one chunk with every model side by side; invalid rows get NaN predictions
+def score_chunk(chunk, model_names, category_map):
+    problems, inputs = validate(chunk, category_map)
+    valid = (problems == '').to_numpy()
+
+    result = chunk.copy()
+    inputs = inputs[valid].copy()
+    for col, categories in category_map.items():
+        inputs[col] = inputs[col].astype(np.asarray(categories).dtype)
+    inputs['month'] = inputs['month'].astype(int)
+    for name in model_names:
+        predictions = np.full(len(chunk), np.nan)
+        if valid.any():
+            predictions[valid] = prediction_table.predict_frame(name, inputs)
+        result[f'predicted_price_{name}'] = np.round(predictions, 4)
+    result['error'] = problems.to_numpy()
+    return result
+
+
+# Score a whole file chunk by chunk, appending the results to `output_path` as CSV.
+# `progress` is called with the fraction of the input processed so far.
+def score_file(file, file_name, output_path, model_names=None, chunksize=CHUNK_SIZE, progress=None):
+    model_names = model_names or list(model_registry.MODEL_FILES)
+    category_map = model_registry.get_category_map(model_names[0])
+
+    rows = 0
+    invalid_rows = 0
+    with open(output_path, 'w', newline='') as out:
+        for i, (chunk, fraction_done) in enumerate(read_chunks(file, file_name, chunksize)):
+            scored = score_chunk(chunk, model_names, category_map)
+            scored.to_csv(out, index=False, header=(i == 0))
+            rows += len(scored)
+            invalid_rows += int((scored['error'] != '').sum())
+            if progress is not None:
+                progress(fraction_done)
+    return rows, invalid_rows
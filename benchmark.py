@@ -0,0 +1,325 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+import chart_data
+import compiled_model
+import data_store
+import extract_pricecatcher
+import filter_index
+import model_registry
+import prediction_table
+import predictive_models
+import rollup_cube
+
+# Folder holding the generated datasets (one CSV per size and seed)
+BENCHMARK_DIR = ".benchmark_data"
+
+REPORT_PATH = "benchmark_report.json"
+BASELINE_PATH = "benchmark_baseline.json"
+
+# A timing counts as a regression when it is this much slower than the baseline...
+TOLERANCE = 0.5
+
+# ...and also at least this many seconds slower, so jitter on millisecond timings is not reported
+MIN_SLOWDOWN = 0.02
+
+# Timings below this (in both runs) are too noisy to compare
+MIN_SECONDS = 0.01
+
+# Calls per timing; the median is reported
+REPEAT = 5
+
+# Training fits and cold loads are slow, so they are timed fewer times
+TRAIN_REPEAT = 3
+
+# Training samples at most this many rows (SVR fits grow quadratically, so it gets fewer)
+TRAIN_ROWS = 200_000
+SVM_TRAIN_ROWS = 20_000
+
+# Rows per call in the batch-prediction timings
+BATCH_ROWS = 100_000
+
+
+# Premise, item and price statistics of the real dataset, used as the template for synthetic rows
+def profile(source=data_store.SOURCE):
+    df = pd.read_csv(source)
+    df['date'] = pd.to_datetime(df['date'], format=data_store.DATE_FORMAT)
+    prices = df.groupby(['item_code', 'premise_type'])['price'].agg(['mean', 'std']).reset_index()
+    prices['std'] = prices['std'].fillna(df['price'].std())
+    return {
+        'premises': df[extract_pricecatcher.PREMISE_COLUMNS].drop_duplicates('premise_code').reset_index(drop=True),
+        'items': df[extract_pricecatcher.ITEM_COLUMNS].drop_duplicates('item_code').reset_index(drop=True),
+        'item_share': df['item_code'].value_counts(normalize=True),
+        'prices': prices,
+        'start': df['date'].min(),
+    }
+
+
+# Synthetic premises: real premises cloned with new codes, names and addresses,
+# keeping the real mix of premise types and districts
+def _premises(template, n_premises, rng):
+    picks = rng.integers(0, len(template), n_premises)
+    premises = template.iloc[picks].reset_index(drop=True)
+    premises['premise_code'] = np.arange(1, n_premises + 1) + 100_000
+    suffix = pd.Series(np.arange(1, n_premises + 1), dtype=str)
+    premises['premise'] = premises['premise'] + ' ' + suffix
+    premises['address'] = 'LOT ' + suffix + ', ' + premises['district'].str.upper()
+    # Each premise prices a little above or below its type's average
+    premises['offset'] = np.round(rng.normal(0, 0.08, n_premises), 2)
+    return premises
+
+
+# Yield synthetic rows in chunks: dates, premises, grades and prices like the real file
+def generate(n_rows, seed=0, chunk_rows=1_000_000, template=None):
+    template = template or profile()
+    rng = np.random.default_rng(seed)
+    # More rows means more premises and a longer history, roughly as in the full PriceCatcher data
+    n_premises = int(max(len(template['premises']), min(n_rows // 2_000, 20_000)))
+    n_days = int(min(max(n_rows // (n_premises * 2), 200), 3_650))
+    premises = _premises(template['premises'], n_premises, rng)
+    items = template['items'].set_index('item_code')
+    prices = template['prices'].set_index(['item_code', 'premise_type'])
+
+    written = 0
+    while written < n_rows:
+        size = min(chunk_rows, n_rows - written)
+        premise_rows = premises.iloc[rng.integers(0, n_premises, size)].reset_index(drop=True)
+        item_codes = rng.choice(template['item_share'].index, size, p=template['item_share'].to_numpy())
+        days = np.sort(rng.integers(0, n_days, size))
+        dates = template['start'] + pd.to_timedelta(days, unit='D')
+
+        stats = prices.reindex(pd.MultiIndex.from_arrays([item_codes, premise_rows['premise_type']]))
+        mean = stats['mean'].fillna(template['prices']['mean'].mean()).to_numpy()
+        std = stats['std'].fillna(template['prices']['std'].mean()).to_numpy()
+        # Small yearly cycle plus noise; prices are quoted to 10 sen like the source
+        season = 0.05 * np.sin(2 * np.pi * days / 365)
+        price = mean + premise_rows['offset'].to_numpy() + season + rng.normal(0, np.minimum(std, 0.2))
+
+        chunk = pd.DataFrame({
+            'date': extract_pricecatcher.format_dates(pd.Series(dates)),
+            'premise_code': premise_rows['premise_code'],
+            'item_code': item_codes,
+            'price': np.round(np.maximum(price, 0.5), 1),
+        })
+        for col in ['premise', 'address', 'premise_type', 'state', 'district']:
+            chunk[col] = premise_rows[col]
+        for col in items.columns:
+            chunk[col] = items[col].reindex(item_codes).to_numpy()
+        written += size
+        yield chunk[extract_pricecatcher.OUTPUT_COLUMNS]
+
+
+# Path of a generated CSV with n_rows rows, written once and reused by later runs
+def dataset(n_rows, seed=0):
+    path = os.path.join(BENCHMARK_DIR, f"telur_synthetic_{n_rows}_{seed}.csv")
+    if os.path.exists(path):
+        return path
+    os.makedirs(BENCHMARK_DIR, exist_ok=True)
+    tmp_path = data_store.temp_path(path)
+    with open(tmp_path, 'w', newline='') as out:
+        for i, chunk in enumerate(generate(n_rows, seed)):
+            chunk.to_csv(out, index=False, header=(i == 0))
+    os.replace(tmp_path, path)
+    return path
+
+
+# Median wall-clock time of `repeat` calls (and the last result). `setup` runs untimed before each call.
+def timed(fn, repeat=REPEAT, setup=None):
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times)), result
+
+
+# load_data() as on the pages: cold (CSV parse + bundle write) and warm (memory-mapped bundle)
+def bench_load(path, results):
+    results['load_data.cold'], _ = timed(
+        lambda: data_store.load(path), repeat=TRAIN_REPEAT,
+        setup=lambda: shutil.rmtree(data_store._dataset_dir(path), ignore_errors=True))
+    results['load_data.warm'], df = timed(lambda: data_store.load(path))
+    return df
+
+
+# The aggregations behind every chart of 1_DESCRIPTIVE.py
+def bench_descriptive(df, results):
+    def prepare():
+        frame = df.copy()
+        frame['month'] = frame['date'].dt.month
+        frame['year'] = frame['date'].dt.year
+        frame['item_code'] = frame['item_code'].replace({118: 'A', 119: 'B', 120: 'C'})
+        return frame
+
+    results['descriptive.prepare'], frame = timed(prepare)
+    results['descriptive.filter_index'], index = timed(lambda: filter_index.build(frame))
+    results['descriptive.cube'], cube = timed(lambda: rollup_cube.build(frame))
+
+    # Filtered path of the page: the first 3 districts, answered from the full cube
+    districts = filter_index.values(index, 'district')[:3]
+    results['descriptive.filter_rows'], _ = timed(lambda: filter_index.rows(index, district=districts))
+    results['descriptive.filtered_cube'], _ = timed(lambda: rollup_cube.select_range(
+        cube, None, None, lambda first_day, last_day: filter_index.rows(index, first_day, last_day, district=districts),
+        district=districts))
+
+    charts = {
+        'district_premise': lambda: rollup_cube.rollup(cube, ['district']),
+        'items': lambda: chart_data.top_n(
+            rollup_cube.rollup(cube, ['premise', 'item_code'])[['premise', 'item_code', 'count']], 'premise'),
+        'grade': lambda: rollup_cube.rollup(cube, ['item_code']),
+        'district': lambda: rollup_cube.rollup(cube, ['district', 'item_code']),
+        'monthly': lambda: rollup_cube.rollup(cube, ['month', 'item_code']),
+        'avg_price': lambda: chart_data.top_n(
+            rollup_cube.rollup(cube, ['premise', 'item_code'])[['premise', 'item_code', 'count', 'price_sum']],
+            'premise', sum_cols=['count', 'price_sum']),
+        'box': lambda: chart_data.box_plot_data(cube, ['item_code']),
+    }
+    for name, chart in charts.items():
+        results[f'descriptive.{name}'], _ = timed(chart)
+
+
+# The training path of 3_PREDICTIVE.py (its own preprocessing, scaling, split, fit and scoring), per model
+def bench_training(df, results, train_rows=TRAIN_ROWS, svm_rows=SVM_TRAIN_ROWS):
+    for name in predictive_models.MODEL_SPECS:
+        max_rows = svm_rows if name == 'SVM' else train_rows
+        sample = df.sample(max_rows, random_state=42) if len(df) > max_rows else df
+        results[f'train.preprocess.{name}'], processed = timed(lambda: predictive_models.preprocess(sample))
+        X, y = processed[predictive_models.FEATURES], processed['price']
+        results[f'train.fit.{name}'], _ = timed(
+            lambda: predictive_models.train_and_evaluate(predictive_models.build_models([name]), X, y),
+            repeat=TRAIN_REPEAT)
+        results[f'train.rows.{name}'] = len(X)
+
+
+# Single- and batch-prediction latency of every shipped pipeline, and of the faster paths
+def bench_prediction(results, batch_rows=BATCH_ROWS, single_repeat=200):
+    for name in model_registry.MODEL_FILES:
+        results[f'predict.load_pipeline.{name}'], pipeline = timed(
+            lambda: joblib.load(model_registry.MODEL_FILES[name]))
+        item_codes, premise_types, districts = model_registry.get_categories(name)
+        one = pd.DataFrame({'item_code': [item_codes[0]], 'premise_type': [premise_types[0]],
+                            'district': [districts[0]], 'month': [1]})
+
+        rng = np.random.default_rng(0)
+        batch = pd.DataFrame({
+            'item_code': np.asarray(item_codes)[rng.integers(0, len(item_codes), batch_rows)],
+            'premise_type': np.asarray(premise_types)[rng.integers(0, len(premise_types), batch_rows)],
+            'district': np.asarray(districts)[rng.integers(0, len(districts), batch_rows)],
+            'month': rng.integers(1, 13, batch_rows),
+        })
+
+        if prediction_table.load_table(name) is None:
+            prediction_table.compile_table(name)
+        model = compiled_model.load(name)
+        inputs = one.iloc[0].to_dict()
+
+        results[f'predict.single.pipeline.{name}'], _ = timed(lambda: pipeline.predict(one), single_repeat)
+        results[f'predict.single.table.{name}'], _ = timed(
+            lambda: prediction_table.predict(name, *one.iloc[0]), single_repeat)
+        results[f'predict.single.compiled.{name}'], _ = timed(
+            lambda: compiled_model.predict_one(model, **inputs), single_repeat)
+        results[f'predict.batch.pipeline.{name}'], _ = timed(lambda: pipeline.predict(batch))
+        results[f'predict.batch.table.{name}'], _ = timed(lambda: prediction_table.predict_frame(name, batch))
+        results[f'predict.batch.compiled.{name}'], _ = timed(lambda: compiled_model.predict(model, batch))
+
+
+# Run every benchmark; results are keyed "<rows>/<benchmark>" (prediction is size-independent)
+def run(sizes, seed=0, train=True, log=print):
+    results = {}
+    for n_rows in sizes:
+        log(f"{n_rows} rows: generating")
+        path = dataset(n_rows, seed)
+        timings = {}
+        log(f"{n_rows} rows: load_data")
+        df = bench_load(path, timings)
+        log(f"{n_rows} rows: descriptive aggregations")
+        bench_descriptive(df, timings)
+        if train:
+            log(f"{n_rows} rows: training")
+            bench_training(df, timings)
+        results.update({f"{n_rows}/{key}": value for key, value in timings.items()})
+        shutil.rmtree(data_store._dataset_dir(path), ignore_errors=True)
+
+    log("prediction latency")
+    timings = {}
+    bench_prediction(timings)
+    results.update({f"predict/{key}": value for key, value in timings.items()})
+
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'sizes': list(sizes),
+        'results': results,
+    }
+
+
+# Keep the faster timing of each benchmark from two reports of the same run settings
+def fastest(report, other):
+    results = {key: min(value, other['results'].get(key, value)) for key, value in report['results'].items()}
+    return {**report, 'results': results}
+
+
+# Benchmarks that got slower than the baseline by more than `tolerance` and `min_slowdown` seconds:
+# list of (key, baseline seconds, current seconds, ratio)
+def compare(report, baseline, tolerance=TOLERANCE, min_seconds=MIN_SECONDS, min_slowdown=MIN_SLOWDOWN):
+    regressions = []
+    for key, current in report['results'].items():
+        previous = baseline['results'].get(key)
+        # Row counts are recorded alongside the timings but are not timings
+        if previous is None or '.rows.' in key or max(current, previous) < min_seconds:
+            continue
+        if current > previous * (1 + tolerance) and current - previous > min_slowdown:
+            regressions.append((key, previous, current, current / previous))
+    return regressions
+
+
+# Example: python benchmark.py --rows 10000 1000000 --baseline benchmark_baseline.json
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark data loading, aggregation, training and prediction")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000],
+                        help="Dataset sizes to generate (10^4 to 10^8)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-train', action='store_true', help="Skip the model training benchmarks")
+    parser.add_argument('--output', default=REPORT_PATH)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    parser.add_argument('--save-baseline', action='store_true', help="Store this run as the new baseline")
+    args = parser.parse_args()
+
+    report = run(args.rows, args.seed, train=not args.no_train)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.output}")
+
+    if args.save_baseline:
+        shutil.copyfile(args.output, args.baseline)
+        print(f"Baseline updated: {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            # A slowdown must show up in a second run too; one-off stalls on a busy machine do not
+            print(f"{len(regressions)} possible regressions, running again to confirm")
+            report = fastest(report, run(args.rows, args.seed, train=not args.no_train))
+            with open(args.output, 'w') as f:
+                json.dump(report, f, indent=2)
+            regressions = compare(report, baseline, args.tolerance)
+        for key, previous, current, ratio in regressions:
+            print(f"REGRESSION {key}: {previous:.4f}s -> {current:.4f}s ({ratio:.2f}x)")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline}")
@@ -0,0 +1,89 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import rollup_cube
+
+# Payload budget: points sent to the browser per line figure, bars per categorical axis,
+# and outlier markers per box. Override with environment variables when deploying.
+MAX_POINTS = int(os.environ.get('CHART_MAX_POINTS', 500))
+MAX_CATEGORIES = int(os.environ.get('CHART_MAX_CATEGORIES', 20))
+MAX_OUTLIERS = int(os.environ.get('CHART_MAX_OUTLIERS', 50))
+
+OTHER_LABEL = 'Other'
+
+
+# Largest-Triangle-Three-Buckets: positions of `threshold` points that keep the shape of the line
+def lttb(x, y, threshold):
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # threshold - 2 buckets between the fixed first and last points
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+
+    selected = [0]
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start = edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        # Keep the point forming the largest triangle with the previous pick and the next bucket's mean
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected.append(a)
+    selected.append(n - 1)
+    return np.array(selected)
+
+
+# Downsample every series (one per `color` value) of a long-format line chart to fit the budget
+def downsample_lines(df, x, y, color=None, max_points=MAX_POINTS):
+    df = df.sort_values([color, x] if color else x)
+    groups = [df] if color is None else [group for _, group in df.groupby(color, observed=True, sort=False)]
+    per_series = max(max_points // max(len(groups), 1), 3)
+
+    parts = []
+    for group in groups:
+        x_values = group[x]
+        if pd.api.types.is_datetime64_any_dtype(x_values):
+            x_values = x_values.astype('int64')
+        parts.append(group.iloc[lttb(x_values.to_numpy(), group[y].to_numpy(), per_series)])
+    return pd.concat(parts) if parts else df
+
+
+# Keep the `n` categories of `col` with the largest total `rank_by` and fold the rest into "Other".
+# Every column other than `sum_cols` is a grouping key; `sum_cols` (default: rank_by) are
+# re-summed over the merged rows, so derive means from sums and counts afterwards.
+def top_n(df, col, n=MAX_CATEGORIES, rank_by='count', sum_cols=None, other_label=OTHER_LABEL):
+    sum_cols = sum_cols or [rank_by]
+    totals = df.groupby(col, observed=True)[rank_by].sum()
+    if len(totals) <= n:
+        return df
+
+    keep = totals.nlargest(n).index
+    df = df.copy()
+    df[col] = df[col].astype(object).where(df[col].isin(keep), other_label)
+    keys = [c for c in df.columns if c not in sum_cols]
+    return df.groupby(keys, observed=True, sort=False)[sum_cols].sum().reset_index()
+
+
+# Box-plot statistics per group plus a capped sample of the outlying price values
+def box_plot_data(cube, by, max_outliers=MAX_OUTLIERS):
+    stats = rollup_cube.box_stats(cube, by)
+
+    hist = cube['hist'].groupby(by + ['price_bin'], observed=True)['n'].sum().reset_index()
+    hist['price'] = hist['price_bin'] * rollup_cube.PRICE_STEP
+    hist = hist.merge(stats[by + ['lowerfence', 'upperfence']], on=by)
+    outliers = hist[(hist['price'] < hist['lowerfence']) | (hist['price'] > hist['upperfence'])]
+
+    # Most frequent outlying prices first, each distinct price shown once
+    outliers = (outliers.sort_values('n', ascending=False)
+                .groupby(by, observed=True).head(max_outliers)[by + ['price', 'n']]
+                .reset_index(drop=True))
+    return stats, outliers
@@ -0,0 +1,238 @@
+import os
+
+import numpy as np
+
+# Folder holding the compiled (NumPy-only) versions of the pickled pipelines
+COMPILED_DIR = ".compiled_models"
+
+# Largest difference from scikit-learn's predictions allowed when a pipeline is compiled
+TOLERANCE = 1e-6
+
+# Rows of the training data the compiled predictions are checked on
+CHECK_ROWS = 5000
+
+# Loaded models: name -> (source stamp, model dict)
+_models = {}
+
+
+def compiled_path(name):
+    return os.path.join(COMPILED_DIR, f"{name.lower()}_model.npz")
+
+
+# Size and mtime of the pickle a model was compiled from
+def _source_stamp(path):
+    stat = os.stat(path)
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+# Flatten a list of fitted sklearn trees into one set of node arrays (children are global node ids)
+def _flatten_trees(trees):
+    arrays = {'left': [], 'right': [], 'feature': [], 'threshold': [], 'value': []}
+    roots = []
+    offset = 0
+    for tree in trees:
+        left, right = tree.children_left, tree.children_right
+        roots.append(offset)
+        arrays['left'].append(np.where(left >= 0, left + offset, -1))
+        arrays['right'].append(np.where(right >= 0, right + offset, -1))
+        arrays['feature'].append(tree.feature)
+        arrays['threshold'].append(tree.threshold)
+        arrays['value'].append(tree.value[:, 0, 0])
+        offset += tree.node_count
+    compiled = {f"tree_{key}": np.concatenate(parts) for key, parts in arrays.items()}
+    compiled['tree_roots'] = np.array(roots)
+    return compiled
+
+
+# Plain arrays describing a fitted preprocessor + regressor pipeline
+def compile_pipeline(pipeline):
+    preprocessor = pipeline.named_steps['preprocessor']
+    encoder = preprocessor.named_transformers_['cat']
+    regressor = pipeline.named_steps['regressor']
+
+    # One-hot layout: each category maps to an output column, or -1 for the dropped / unknown ones
+    compiled = {'categorical': np.array(encoder.feature_names_in_, dtype=str)}
+    column = 0
+    for j, categories in enumerate(encoder.categories_):
+        drop = encoder.drop_idx_[j] if encoder.drop_idx_ is not None else None
+        columns = np.full(len(categories), -1)
+        for k in range(len(categories)):
+            if k != drop:
+                columns[k] = column
+                column += 1
+        compiled[f"categories_{j}"] = np.array([str(c) for c in categories])
+        compiled[f"columns_{j}"] = columns
+
+    # Passthrough columns follow the one-hot block. The remainder lists column positions up to
+    # scikit-learn 1.6 and column names from 1.7 on.
+    remainder = [cols for name, _, cols in preprocessor.transformers_ if name == 'remainder']
+    passthrough = [col if isinstance(col, str) else pipeline.feature_names_in_[col]
+                   for col in (remainder[0] if remainder else [])]
+    compiled['passthrough'] = np.array(passthrough, dtype=str)
+    compiled['n_features'] = np.array(column + len(passthrough))
+
+    kind = type(regressor).__name__
+    if hasattr(regressor, 'coef_'):
+        compiled['kind'] = np.array('linear')
+        compiled['coef'] = np.ravel(regressor.coef_).astype(np.float64)
+        compiled['intercept'] = np.array(np.ravel(regressor.intercept_)[0], dtype=np.float64)
+    elif hasattr(regressor, 'estimators_'):
+        compiled['kind'] = np.array('forest')
+        compiled.update(_flatten_trees([est.tree_ for est in regressor.estimators_]))
+    elif hasattr(regressor, 'tree_'):
+        compiled['kind'] = np.array('forest')
+        compiled.update(_flatten_trees([regressor.tree_]))
+    elif hasattr(regressor, 'support_vectors_'):
+        compiled['kind'] = np.array('svr')
+        compiled['support_vectors'] = np.asarray(regressor.support_vectors_, dtype=np.float64)
+        compiled['dual_coef'] = np.ravel(regressor.dual_coef_).astype(np.float64)
+        compiled['intercept'] = np.array(regressor.intercept_[0], dtype=np.float64)
+        compiled['kernel'] = np.array(regressor.kernel)
+        compiled['gamma'] = np.array(regressor._gamma, dtype=np.float64)
+        compiled['degree'] = np.array(regressor.degree)
+        compiled['coef0'] = np.array(regressor.coef0, dtype=np.float64)
+    else:
+        raise ValueError(f"Cannot compile a {kind} regressor")
+    return compiled
+
+
+# Raise if the compiled model's predictions differ from the pipeline's on (a sample of) the training data
+def check(name, pipeline, compiled, X=None, tolerance=TOLERANCE):
+    if X is None:
+        import tune_models
+        X, _ = tune_models.load_training_data()
+        if len(X) > CHECK_ROWS:
+            X = X.sample(CHECK_ROWS, random_state=0)
+    difference = np.abs(predict(_prepare(dict(compiled)), X) - pipeline.predict(X)).max()
+    if not difference <= tolerance:
+        raise ValueError(f"Compiled {name} model differs from scikit-learn by {difference:.2e} "
+                         f"(tolerance {tolerance:.0e})")
+    return difference
+
+
+# Compile a shipped pipeline to COMPILED_DIR (needs scikit-learn, unlike the runtime below).
+# The compiled model is only written once its predictions match the pipeline's.
+def export(name, X=None):
+    import data_store
+    import model_registry
+
+    source = model_registry.MODEL_FILES[name]
+    pipeline = model_registry.get_pipeline(name)
+    compiled = compile_pipeline(pipeline)
+    check(name, pipeline, compiled, X)
+    compiled['source'] = np.array(source)
+    compiled['source_stamp'] = np.array(_source_stamp(source))
+
+    os.makedirs(COMPILED_DIR, exist_ok=True)
+    path = compiled_path(name)
+    tmp_path = data_store.temp_path(path, '.tmp.npz')
+    np.savez(tmp_path, **compiled)
+    os.replace(tmp_path, path)
+    _models.pop(name, None)
+    return path
+
+
+# Compiled model for `name`: arrays plus category lookups. Recompiled if the pickle changed.
+def load(name):
+    entry = _models.get(name)
+    if entry is not None and entry[0] == _source_stamp(str(entry[1]['source'])):
+        return entry[1]
+
+    path = compiled_path(name)
+    if not os.path.exists(path):
+        export(name)
+    with np.load(path) as data:
+        model = {key: data[key] for key in data.files}
+    stamp = str(model['source_stamp'])
+    if stamp != _source_stamp(str(model['source'])):
+        export(name)
+        return load(name)
+
+    _models[name] = (stamp, _prepare(model))
+    return model
+
+
+# Category lookups used by transform()
+def _prepare(model):
+    model['kind'] = str(model['kind'])
+    model['lookups'] = [
+        {category: column for category, column in zip(model[f"categories_{j}"], model[f"columns_{j}"])}
+        for j in range(len(model['categorical']))
+    ]
+    return model
+
+
+# Dense design matrix, same column order as the pipeline's ColumnTransformer
+def transform(model, rows):
+    n_rows = len(rows[str(model['categorical'][0])])
+    X = np.zeros((n_rows, int(model['n_features'])))
+    row_index = np.arange(n_rows)
+    for col, lookup in zip(model['categorical'], model['lookups']):
+        columns = np.array([lookup.get(str(value), -1) for value in rows[str(col)]])
+        known = columns >= 0
+        X[row_index[known], columns[known]] = 1.0
+
+    first = X.shape[1] - len(model['passthrough'])
+    for i, col in enumerate(model['passthrough']):
+        X[:, first + i] = np.asarray(rows[str(col)], dtype=np.float64)
+    return X
+
+
+# Walk every tree for every row at once; leaves have no left child
+def _predict_trees(model, X):
+    X = X.astype(np.float32)
+    left, right = model['tree_left'], model['tree_right']
+    feature, threshold = model['tree_feature'], model['tree_threshold']
+    nodes = np.repeat(model['tree_roots'][:, None], len(X), axis=1)
+    row_index = np.arange(len(X))[None, :]
+    while True:
+        children = left[nodes]
+        internal = children >= 0
+        if not internal.any():
+            break
+        go_left = X[row_index, feature[nodes]] <= threshold[nodes]
+        nodes = np.where(internal, np.where(go_left, children, right[nodes]), nodes)
+    return model['tree_value'][nodes].mean(axis=0)
+
+
+def _predict_svr(model, X):
+    vectors, gamma = model['support_vectors'], float(model['gamma'])
+    kernel = str(model['kernel'])
+    if kernel == 'rbf':
+        distances = (X ** 2).sum(axis=1)[:, None] - 2 * X @ vectors.T + (vectors ** 2).sum(axis=1)[None, :]
+        K = np.exp(-gamma * np.maximum(distances, 0))
+    elif kernel == 'linear':
+        K = X @ vectors.T
+    elif kernel == 'poly':
+        K = (gamma * X @ vectors.T + model['coef0']) ** int(model['degree'])
+    else:
+        K = np.tanh(gamma * X @ vectors.T + model['coef0'])
+    return K @ model['dual_coef'] + model['intercept']
+
+
+# Predictions for `rows` (a DataFrame or a dict of column -> values) using NumPy only
+def predict(model, rows):
+    X = transform(model, rows)
+    if model['kind'] == 'linear':
+        return X @ model['coef'] + model['intercept']
+    if model['kind'] == 'forest':
+        return _predict_trees(model, X)
+    return _predict_svr(model, X)
+
+
+# Single prediction from keyword inputs, e.g. predict_one(model, item_code=1, month=3, ...)
+def predict_one(model, **inputs):
+    return float(predict(model, {col: [value] for col, value in inputs.items()})[0])
+
+
+# Compile every shipped pipeline and check it against scikit-learn: python compiled_model.py
+if __name__ == "__main__":
+    import data_store
+    import model_registry
+    import tune_models
+
+    X, _ = tune_models.load_training_data(data_store.load())
+    for model_name in model_registry.MODEL_FILES:
+        print(f"{model_name}: compiled -> {export(model_name, X)}")
+        difference = np.abs(predict(load(model_name), X) - model_registry.get_pipeline(model_name).predict(X))
+        print(f"{model_name}: max difference from scikit-learn {difference.max():.2e} over {len(X)} rows")
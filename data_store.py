@@ -0,0 +1,183 @@
+import io
+import json
+import os
+import shutil
+import threading
+import uuid
+
+import numpy as np
+import pandas as pd
+
+import perf
+
+# Source dataset shared by the pages
+SOURCE = "telur kelantan filtered.csv"
+
+# Folder holding the converted columnar copies
+STORE_DIR = ".data_store"
+
+# Bump when the on-disk layout changes so old bundles are rebuilt
+FORMAT_VERSION = 1
+
+DATE_FORMAT = '%m/%d/%Y'
+
+# Serializes bundle conversion: sessions and the warm-up thread share one process
+_build_lock = threading.Lock()
+
+
+# Unique temporary name next to `path` for an atomic write-then-replace. The process id alone is
+# not enough, since Streamlit sessions and the warm-up all run as threads of one process.
+def temp_path(path, suffix='.tmp'):
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.{uuid.uuid4().hex[:8]}{suffix}"
+
+
+# Identify a version of the source file by its size and modification time
+def source_fingerprint(source):
+    stat = os.stat(source)
+    return f"v{FORMAT_VERSION}-{stat.st_size}-{stat.st_mtime_ns}"
+
+
+def _dataset_dir(source):
+    name = os.path.splitext(os.path.basename(source))[0].replace(' ', '_')
+    return os.path.join(STORE_DIR, name)
+
+
+# Smallest signed integer type that can hold category codes for n categories
+def _code_dtype(n):
+    return np.int8 if n < 2**7 else np.int16 if n < 2**15 else np.int32
+
+
+# Write a typed frame as one .npy file per column plus a meta.json describing them.
+# Strings become category codes + dictionary, dates become int32 days since 1970, price float32.
+def write_bundle(df, bundle_dir, fingerprint):
+    tmp_dir = temp_path(bundle_dir)
+    os.makedirs(tmp_dir)
+
+    columns = {}
+    for col in df.columns:
+        series = df[col]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            categories = series.cat.categories
+            values = series.cat.codes.to_numpy().astype(_code_dtype(len(categories)))
+            columns[col] = {'kind': 'category', 'categories': categories.tolist()}
+        elif pd.api.types.is_datetime64_any_dtype(series):
+            values = (series.to_numpy().astype('datetime64[D]').astype(np.int64)).astype(np.int32)
+            columns[col] = {'kind': 'date'}
+        else:
+            values = series.to_numpy()
+            columns[col] = {'kind': 'numeric'}
+        np.save(os.path.join(tmp_dir, f"{col}.npy"), values)
+
+    # meta.json is written last and marks the bundle as complete
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+        json.dump({'fingerprint': fingerprint, 'rows': len(df), 'columns': columns}, f)
+
+    try:
+        os.replace(tmp_dir, bundle_dir)
+    except OSError:
+        # Another worker finished the same bundle first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+# Read a bundle back; numeric and code arrays are memory-mapped
+def read_bundle(bundle_dir, columns=None):
+    with open(os.path.join(bundle_dir, 'meta.json')) as f:
+        meta = json.load(f)
+
+    data = {}
+    for col, info in meta['columns'].items():
+        if columns is not None and col not in columns:
+            continue
+        values = np.load(os.path.join(bundle_dir, f"{col}.npy"), mmap_mode='r')
+        if info['kind'] == 'category':
+            data[col] = pd.Categorical.from_codes(values, categories=info['categories'])
+        elif info['kind'] == 'date':
+            # The one column that is copied: pandas has no day-resolution datetimes, so the int32 days
+            # are widened to datetime64 in memory
+            data[col] = pd.to_datetime(np.asarray(values, dtype=np.int64), unit='D')
+        else:
+            data[col] = values
+    # copy=False keeps the memory-mapped arrays as the frame's columns instead of consolidating them
+    # into new blocks, so processes reading the same bundle share its pages
+    return pd.DataFrame(data, copy=False)
+
+
+# Parse the CSV once with explicit types
+def parse_csv(source):
+    return _typed(pd.read_csv(source))
+
+
+def _typed(df):
+    df['date'] = pd.to_datetime(df['date'], format=DATE_FORMAT)
+    df['price'] = df['price'].astype(np.float32)
+    for col in df.columns:
+        if pd.api.types.is_object_dtype(df[col]) or pd.api.types.is_string_dtype(df[col]):
+            df[col] = df[col].astype('category')
+        elif pd.api.types.is_integer_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], downcast='integer')
+    return df
+
+
+# Path of an up-to-date bundle for `source`, converting the CSV if it changed
+def ensure_bundle(source=SOURCE):
+    fingerprint = source_fingerprint(source)
+    bundle_dir = os.path.join(_dataset_dir(source), fingerprint)
+    if os.path.exists(os.path.join(bundle_dir, 'meta.json')):
+        return bundle_dir
+
+    with _build_lock:
+        return _ensure_bundle_locked(source)
+
+
+# ensure_bundle() for callers already holding _build_lock
+def _ensure_bundle_locked(source):
+    fingerprint = source_fingerprint(source)
+    bundle_dir = os.path.join(_dataset_dir(source), fingerprint)
+    # Another thread may have converted it while we waited for the lock
+    if not os.path.exists(os.path.join(bundle_dir, 'meta.json')):
+        with perf.span('load', f"parse {os.path.basename(source)}"):
+            write_bundle(parse_csv(source), bundle_dir, fingerprint)
+        _drop_old_bundles(source, fingerprint)
+    return bundle_dir
+
+
+# Drop bundles built from older versions of the source
+def _drop_old_bundles(source, fingerprint):
+    for old in os.listdir(_dataset_dir(source)):
+        if old != fingerprint and not old.endswith('.tmp'):
+            shutil.rmtree(os.path.join(_dataset_dir(source), old), ignore_errors=True)
+
+
+# Append rows (in the CSV's column layout and date format) to the end of the source CSV. The new
+# bundle is the current one plus the typed new rows, so the whole file is not parsed again.
+def append_csv(rows, source=SOURCE):
+    with _build_lock:
+        # Read under the lock, so a conversion running in another thread cannot change the source
+        # between this read and the append
+        current = read_bundle(_ensure_bundle_locked(source))
+        rows.to_csv(source, mode='a', index=False, header=False)
+        new = _typed(pd.read_csv(io.StringIO(rows.to_csv(index=False))))
+        df = pd.concat([current, new], ignore_index=True)
+        # Same types parse_csv would give the whole file: categories over the union of values
+        for col in df.columns:
+            if isinstance(current[col].dtype, pd.CategoricalDtype):
+                df[col] = df[col].astype(object).astype('category')
+            elif pd.api.types.is_integer_dtype(df[col]):
+                df[col] = pd.to_numeric(df[col], downcast='integer')
+
+        fingerprint = source_fingerprint(source)
+        write_bundle(df, os.path.join(_dataset_dir(source), fingerprint), fingerprint)
+        _drop_old_bundles(source, fingerprint)
+
+
+# Typed DataFrame for `source`, read from the columnar bundle
+def load(source=SOURCE, columns=None):
+    return read_bundle(ensure_bundle(source), columns)
+
+
+# Version string of the current data (changes whenever the source changes), None if it is missing
+def data_version(source=SOURCE):
+    try:
+        return source_fingerprint(source)
+    except OSError:
+        return None
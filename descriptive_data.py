@@ -0,0 +1,270 @@
+import plotly.express as px  # For interactive visualizations
+import plotly.graph_objects as go
+import streamlit as st
+
+import chart_data
+import data_store
+import figure_cache
+import filter_index
+import perf
+import rollup_cube
+
+# Data loaders and charts of 1_DESCRIPTIVE.py. They live here rather than in the page so warmup.py can
+# fill the same st.cache_data / st.cache_resource entries and figure_cache keys before the first visit.
+
+# Egg grades shown in place of the item codes
+GRADES = {118: 'A', 119: 'B', 120: 'C'}
+
+
+# Function to load and preprocess the dataset (the version argument refreshes the cache when the CSV changes)
+@st.cache_data
+def load_data(version):
+    perf.count('load_data.miss')
+    try:
+        # Load the typed columnar copy of the CSV (rebuilt only when the CSV changes)
+        df = data_store.load()
+
+        # Extract month and year
+        df['month'] = df['date'].dt.month
+        df['year'] = df['date'].dt.year
+
+        # Replace item codes with grades
+        df['item_code'] = df['item_code'].replace(GRADES)
+        return df
+    except Exception as e:
+        st.error(f"Error loading data: {e}")
+        return None
+
+
+# Function to build the filter index (rows sorted by date + a bitmap per category value).
+# cache_resource shares one copy across sessions instead of copying it on every rerun.
+@st.cache_resource
+def load_index(version):
+    perf.count('load_index.miss')
+    df = load_data(version)
+    if df is None:
+        return None
+    return filter_index.build(df)
+
+
+# Function to merge the per-month histograms that ingest.py keeps up to date into the cube of the whole
+# history, once per data version (shared across sessions). Only an appended month is re-aggregated.
+@st.cache_resource
+def load_full_cube(version):
+    import ingest
+
+    perf.count('load_full_cube.miss')
+    ingest.ensure_partitions()
+    hist = ingest.read_partitions('aggregates')
+    # Same grade labels as load_data
+    hist['item_code'] = hist['item_code'].replace(GRADES)
+    return rollup_cube.from_hist(hist)
+
+
+# Function to answer the filters from the full cube: whole months are selected from it, and only the
+# partial months at the ends of the date range are read from the filtered rows
+@st.cache_data(max_entries=64)
+def load_cube(version, start, end, districts, grades, premise_types):
+    perf.count('load_cube.miss')
+    index = load_index(version)
+    filters = {'district': districts, 'item_code': grades, 'premise_type': premise_types}
+    cube = rollup_cube.select_range(
+        load_full_cube(version), start, end,
+        lambda first_day, last_day: filter_index.rows(index, first_day, last_day, **filters),
+        **{dim: list(values) or None for dim, values in filters.items()}
+    )
+    if cube['hist'].empty:
+        return None
+    return cube
+
+
+# Cube for the sidebar filters. A range reaching the first or last date is open-ended, so the default
+# range shares one cache entry and its end months come from the cube.
+def cube_for(version, index, start, end, districts, grades, premise_types):
+    min_date, max_date = filter_index.date_bounds(index)
+    return load_cube(version, start if start > min_date else None, end if end < max_date else None,
+                     tuple(districts), tuple(grades), tuple(premise_types))
+
+
+# Visualization 1: Distribution of premises per district with Plotly
+def build_district_premise(cube):
+    district_premise_counts = rollup_cube.rollup(cube, ['district'])[['district', 'count']]
+    district_premise_counts.rename(columns={'count': 'premise_count'}, inplace=True)
+    fig_district_premise = px.bar(
+        district_premise_counts,
+        x='district',
+        y='premise_count',
+        labels={'district': 'District', 'premise_count': 'Number of Premises'},
+        color='district',  # Optional: color bars by district for better visibility
+        color_discrete_sequence=px.colors.qualitative.Set3
+    )
+    return fig_district_premise
+
+
+# Visualization 2: Item counts per premise
+def build_items(cube):
+    grouped = rollup_cube.rollup(cube, ['premise', 'item_code'])[['premise', 'item_code', 'count']]
+    # Only the busiest premises get their own bars; the rest are folded into "Other"
+    grouped = chart_data.top_n(grouped, 'premise')
+    fig_items = px.bar(
+        grouped,
+        x='premise',
+        y='count',
+        color='item_code',
+        labels={'count': 'Count', 'premise': 'Premise', 'item_code': 'Egg Grade'},
+        barmode='group'
+    )
+    return fig_items
+
+
+# Visualization 3: Grade distribution with a pie chart
+def build_grade(cube):
+    grade_counts = rollup_cube.rollup(cube, ['item_code'])[['item_code', 'count']].sort_values('count', ascending=False)
+    grade_counts.columns = ['Grade', 'Count']
+    fig_grade = px.pie(
+        grade_counts,
+        values='Count',
+        names='Grade',
+        color_discrete_sequence=px.colors.sequential.RdBu
+    )
+    return fig_grade
+
+
+# Visualization 4: Item counts per district
+def build_district(cube):
+    grouped_district = rollup_cube.rollup(cube, ['district', 'item_code'])[['district', 'item_code', 'count']]
+    fig_district = px.bar(
+        grouped_district,
+        x='district',
+        y='count',
+        color='item_code',
+        labels={'district': 'District', 'count': 'Count', 'item_code': 'Egg Grade'},
+        barmode='stack'
+    )
+    return fig_district
+
+
+# Visualization 5: Monthly trends of egg counts (Styled like other graphs)
+def build_monthly(cube):
+    monthly_counts = rollup_cube.rollup(cube, ['month', 'item_code'])[['month', 'item_code', 'count']]
+
+    # Create a Plotly bar chart for the monthly trends
+    fig_monthly = px.bar(
+        monthly_counts,
+        x='month',
+        y='count',
+        color='item_code',
+        labels={'month': 'Month', 'count': 'Count', 'item_code': 'Egg Grade'},
+        color_discrete_sequence=px.colors.qualitative.Set3,
+        barmode='group'  # This ensures the bars for each grade are grouped
+    )
+
+    # Update x-axis labels to show months
+    fig_monthly.update_xaxes(
+        tickmode='array',
+        tickvals=list(range(1, 13)),  # Months from 1 to 12
+        ticktext=['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+    )
+
+    # Update layout for better styling
+    fig_monthly.update_layout(
+        title_font_size=18,
+        title_font_family='Arial',
+        title_font_color='white',
+        xaxis_title='Month',
+        yaxis_title='Count',
+        xaxis_title_font_size=14,
+        yaxis_title_font_size=14,
+        xaxis_title_font_color='white',
+        yaxis_title_font_color='white',
+        legend_title='Egg Grade',
+        legend_title_font_size=12,
+        legend_font_size=12,
+        plot_bgcolor='black'
+    )
+    return fig_monthly
+
+
+# Visualization 6: Average price per grade by premise
+def build_avg_price(cube):
+    avg_price = rollup_cube.rollup(cube, ['premise', 'item_code'])[['premise', 'item_code', 'count', 'price_sum']]
+    avg_price = chart_data.top_n(avg_price, 'premise', sum_cols=['count', 'price_sum'])
+    avg_price['price'] = avg_price['price_sum'] / avg_price['count']
+    fig_avg_price = px.bar(
+        avg_price,
+        x='premise',
+        y='price',
+        color='item_code',
+        labels={'premise': 'Premise', 'price': 'Average Price', 'item_code': 'Egg Grade'},
+        barmode='group'
+    )
+    return fig_avg_price
+
+
+# Extra Visualization: Boxplot for price distribution by grade
+def build_box(cube):
+    # Quartiles and whiskers come from the cube's price histograms, not the raw rows
+    box, outliers = chart_data.box_plot_data(cube, ['item_code'])
+    fig_box = go.Figure()
+    for i, row in box.iterrows():
+        color = px.colors.qualitative.Plotly[i % len(px.colors.qualitative.Plotly)]
+        fig_box.add_trace(go.Box(
+            name=row['item_code'],
+            x=[row['item_code']],
+            q1=[row['q1']],
+            median=[row['median']],
+            q3=[row['q3']],
+            lowerfence=[row['lowerfence']],
+            upperfence=[row['upperfence']],
+            marker_color=color
+        ))
+        # A capped sample of the outlying prices, drawn as points next to the box
+        grade_outliers = outliers[outliers['item_code'] == row['item_code']]
+        if not grade_outliers.empty:
+            fig_box.add_trace(go.Scatter(
+                x=[row['item_code']] * len(grade_outliers),
+                y=grade_outliers['price'],
+                mode='markers',
+                marker=dict(color=color, symbol='circle-open'),
+                showlegend=False,
+                hovertemplate='Price: %{y}<extra></extra>'
+            ))
+    fig_box.update_layout(xaxis_title='Egg Grade', yaxis_title='Price', legend_title='item_code')
+    return fig_box
+
+
+# Visualization 7: Average egg price by month and grade
+def build_monthly_prices(cube):
+    # Group data by month and item_code, and get the average price
+    monthly_prices = rollup_cube.rollup(cube, ['month', 'item_code']).rename(columns={'price_mean': 'price'})
+
+    # Create a Plotly line chart
+    fig = px.line(monthly_prices,
+                  x='month',
+                  y='price',
+                  color='item_code',
+                  markers=True,
+                  labels={'month': 'Month', 'price': 'Average Price', 'item_code': 'Egg Grade'},
+                  category_orders={'month': ['1', '2', '3', '4', '5', '6', '7', '8', '9', '10', '11', '12']})
+    return fig
+
+
+# Charts in page order: (figure_cache id, subheader, build function)
+CHARTS = [
+    ('district_premise', "Distribution of Premises per District", build_district_premise),
+    ('items', "Item Counts per Premise (by Grade)", build_items),
+    ('grade', "Distribution of Egg Grades", build_grade),
+    ('district', "Item Grade Counts per District", build_district),
+    ('monthly', "Monthly Trends of Egg Counts by Grade", build_monthly),
+    ('avg_price', "Average Price per Grade at Each Premise", build_avg_price),
+    ('box', "Price Distribution by Grade", build_box),
+    ('monthly_prices', "Average Egg Price by Month and Grade", build_monthly_prices),
+]
+
+
+# (subheader, figure) of every chart for these filters. Figures are cached per (data version, chart,
+# filters), so unchanged charts are not rebuilt.
+def figures(version, cube, start, end, districts, grades, premise_types):
+    filters = [str(start), str(end), list(districts), list(grades), list(premise_types)]
+    for chart_id, title, build in CHARTS:
+        yield title, figure_cache.get(chart_id, version, filters, lambda: build(cube))
@@ -0,0 +1,140 @@
+import argparse
+import hashlib
+import json
+import time
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+
+import data_store
+import model_cache
+
+# Rows sampled for explanations; permutation importance costs n_features x n_repeats predictions on them
+MAX_ROWS = 2000
+
+N_REPEATS = 5
+
+# Partial dependence is evaluated at most at this many values per feature
+GRID_POINTS = 20
+
+# model_cache namespace of explanations (capped separately from the training runs)
+CACHE_NAMESPACE = 'explanations'
+
+
+# Cache key of an explanation: which model (hash), which data (version) and the settings
+def explanation_key(model_hash, data_version, **params):
+    text = json.dumps(['explain', model_hash, data_version, sorted(params.items())], default=str)
+    return hashlib.sha256(text.encode()).hexdigest()[:24]
+
+
+def _predict(estimator, scaler, X):
+    return estimator.predict(scaler.transform(X) if scaler is not None else X)
+
+
+def _mae(estimator, scaler, X, y):
+    return float(np.mean(np.abs(_predict(estimator, scaler, X) - y)))
+
+
+# MAE after shuffling one column (one task in the process pool)
+def _permuted_mae(estimator, scaler, X, y, column, seed):
+    X = X.copy()
+    X[column] = np.random.default_rng(seed).permutation(X[column].to_numpy())
+    return column, _mae(estimator, scaler, X, y)
+
+
+# Increase in MAE when each feature is shuffled, over n_repeats shuffles spread across processes
+def permutation_importance(estimator, X, y, scaler=None, n_repeats=N_REPEATS, n_jobs=-1, random_state=42):
+    y = np.asarray(y, dtype=float)
+    baseline = _mae(estimator, scaler, X, y)
+    scores = Parallel(n_jobs=n_jobs, backend='loky')(
+        delayed(_permuted_mae)(estimator, scaler, X, y, column, random_state + repeat)
+        for column in X.columns for repeat in range(n_repeats)
+    )
+    scores = pd.DataFrame(scores, columns=['feature', 'mae'])
+    importance = scores.groupby('feature', sort=False)['mae'].agg(['mean', 'std']).sub([baseline, 0])
+    importance.columns = ['importance_mean', 'importance_std']
+    return importance.reset_index().sort_values('importance_mean', ascending=False, ignore_index=True)
+
+
+# Values a feature is evaluated at: every value if there are few, else evenly spaced quantiles
+def _grid(values, grid_points):
+    unique = pd.unique(values)
+    if len(unique) <= grid_points or not pd.api.types.is_numeric_dtype(values):
+        return np.sort(unique) if pd.api.types.is_numeric_dtype(values) else unique
+    return np.unique(np.quantile(values, np.linspace(0, 1, grid_points)))
+
+
+# Average prediction with one feature set to each grid value (one task in the process pool)
+def _feature_dependence(estimator, scaler, X, feature, grid_points):
+    grid = _grid(X[feature], grid_points)
+    stacked = pd.concat([X] * len(grid), ignore_index=True)
+    stacked[feature] = np.repeat(grid, len(X))
+    predictions = _predict(estimator, scaler, stacked).reshape(len(grid), len(X)).mean(axis=1)
+    return pd.DataFrame({'feature': feature, 'value': grid, 'prediction': predictions})
+
+
+# Partial-dependence curves for the given features, one feature per process
+def partial_dependence(estimator, X, features=None, scaler=None, grid_points=GRID_POINTS, n_jobs=-1):
+    features = list(X.columns) if features is None else features
+    curves = Parallel(n_jobs=n_jobs, backend='loky')(
+        delayed(_feature_dependence)(estimator, scaler, X, feature, grid_points) for feature in features
+    )
+    return pd.concat(curves, ignore_index=True)
+
+
+# Permutation importance and partial dependence on a subsample of at most max_rows rows.
+# `scaler` is applied before predicting, for models fitted on standardized inputs.
+def explain(estimator, X, y, scaler=None, max_rows=MAX_ROWS, n_repeats=N_REPEATS, grid_points=GRID_POINTS,
+            n_jobs=-1, random_state=42):
+    start = time.perf_counter()
+    if len(X) > max_rows:
+        sample = X.sample(max_rows, random_state=random_state).index
+        X, y = X.loc[sample], y.loc[sample]
+    X = X.reset_index(drop=True)
+    y = pd.Series(y).reset_index(drop=True)
+    return {
+        'importance': permutation_importance(estimator, X, y, scaler, n_repeats, n_jobs, random_state),
+        'partial_dependence': partial_dependence(estimator, X, None, scaler, grid_points, n_jobs),
+        'rows': len(X),
+        'seconds': time.perf_counter() - start,
+    }
+
+
+# Key of a pickled PREDICT APP pipeline's explanation: pickle hash + data version + settings
+def pipeline_explanation_key(name, max_rows=MAX_ROWS, n_repeats=N_REPEATS, grid_points=GRID_POINTS):
+    import prediction_table
+    return explanation_key(prediction_table.pipeline_version(name), data_store.data_version(),
+                           max_rows=max_rows, n_repeats=n_repeats, grid_points=grid_points)
+
+
+# Explanation of a pickled pipeline on the current data, computed once and cached
+def explain_pipeline(name, max_rows=MAX_ROWS, n_repeats=N_REPEATS, grid_points=GRID_POINTS, n_jobs=-1):
+    import model_registry
+    import tune_models
+
+    def compute():
+        X, y = tune_models.load_training_data()
+        return explain(model_registry.get_pipeline(name), X, y, max_rows=max_rows, n_repeats=n_repeats,
+                       grid_points=grid_points, n_jobs=n_jobs)
+
+    key = pipeline_explanation_key(name, max_rows, n_repeats, grid_points)
+    return model_cache.load_or_compute(key, compute, namespace=CACHE_NAMESPACE)
+
+
+# Precompute the explanations of every shipped pipeline (e.g. after a deploy): python explain.py
+if __name__ == "__main__":
+    import model_registry
+
+    parser = argparse.ArgumentParser(description="Precompute permutation importance and partial dependence")
+    parser.add_argument('models', nargs='*', default=list(model_registry.MODEL_FILES))
+    parser.add_argument('--max-rows', type=int, default=MAX_ROWS)
+    parser.add_argument('--repeats', type=int, default=N_REPEATS)
+    parser.add_argument('--jobs', type=int, default=-1)
+    args = parser.parse_args()
+
+    for model_name in args.models:
+        result = explain_pipeline(model_name, args.max_rows, args.repeats, n_jobs=args.jobs)
+        top = result['importance'].iloc[0]
+        print(f"{model_name}: {result['rows']} rows in {result['seconds']:.1f}s, "
+              f"most important: {top['feature']} (+{top['importance_mean']:.4f} MAE)")
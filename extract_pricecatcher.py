@@ -0,0 +1,142 @@
+import argparse
+import glob
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+# Column order of "telur kelantan filtered.csv"
+OUTPUT_COLUMNS = ['date', 'premise_code', 'item_code', 'price', 'premise', 'address', 'premise_type',
+                  'state', 'district', 'item', 'unit', 'item_group', 'item_category']
+PREMISE_COLUMNS = ['premise_code', 'premise', 'address', 'premise_type', 'state', 'district']
+ITEM_COLUMNS = ['item_code', 'item', 'unit', 'item_group', 'item_category']
+
+# Rows of a raw price file held in memory at once (per worker)
+CHUNK_SIZE = 500_000
+
+
+# Read a lookup table (small, so it is read in full) keeping only the needed columns
+def read_lookup(path, columns):
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path, columns=columns)
+    return pd.read_csv(path, usecols=columns)
+
+
+# Lookup rows that pass the state / item category filters (None keeps every state / category,
+# e.g. to extract the data for segment_training.py)
+def filter_lookups(premise_path, item_path, state='Kelantan', item_category='TELUR'):
+    premises = read_lookup(premise_path, PREMISE_COLUMNS).dropna(subset=['premise_code'])
+    if state is not None:
+        premises = premises[premises['state'] == state]
+    items = read_lookup(item_path, ITEM_COLUMNS).dropna(subset=['item_code'])
+    if item_category is not None:
+        items = items[items['item_category'] == item_category]
+    premises['premise_code'] = premises['premise_code'].astype('int64')
+    items['item_code'] = items['item_code'].astype('int64')
+    return premises, items
+
+
+# Yield bounded-size chunks of (date, premise_code, item_code, price) from a raw price file
+def read_fact_chunks(path, chunksize=CHUNK_SIZE):
+    columns = ['date', 'premise_code', 'item_code', 'price']
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunksize)
+
+
+# Format dates like the shipped CSV (m/d/yyyy, no zero padding)
+def format_dates(dates):
+    return dates.dt.month.astype(str) + '/' + dates.dt.day.astype(str) + '/' + dates.dt.year.astype(str)
+
+
+# Stream one raw price file: filter on the lookup keys before joining, then append
+# each month's rows to its own partition. Returns the number of rows written.
+def extract_file(path, premises, items, output_dir, chunksize=CHUNK_SIZE):
+    premise_codes = premises['premise_code'].to_numpy()
+    item_codes = items['item_code'].to_numpy()
+    part_name = f"part-{os.path.splitext(os.path.basename(path))[0]}.csv"
+
+    rows = 0
+    for chunk in read_fact_chunks(path, chunksize):
+        # Predicate pushdown: drop rows outside the state / category before the join
+        chunk = chunk.dropna(subset=['premise_code', 'item_code'])
+        chunk = chunk[chunk['premise_code'].isin(premise_codes) & chunk['item_code'].isin(item_codes)]
+        if chunk.empty:
+            continue
+
+        chunk = chunk.astype({'premise_code': 'int64', 'item_code': 'int64'})
+        chunk = chunk.merge(premises, on='premise_code').merge(items, on='item_code')
+        dates = pd.to_datetime(chunk['date'])
+        chunk['date'] = format_dates(dates)
+
+        for month, part in chunk.groupby(dates.dt.strftime('%Y-%m').to_numpy()):
+            month_dir = os.path.join(output_dir, f"month={month}")
+            os.makedirs(month_dir, exist_ok=True)
+            part_path = os.path.join(month_dir, part_name)
+            part[OUTPUT_COLUMNS].to_csv(part_path, mode='a', index=False, header=not os.path.exists(part_path))
+            rows += len(part)
+    return rows
+
+
+# Concatenate the month partitions (in month order) into a single CSV, one file at a time
+def combine_partitions(output_dir, combined_path):
+    tmp_path = f"{combined_path}.tmp"
+    with open(tmp_path, 'w', newline='') as out:
+        out.write(','.join(OUTPUT_COLUMNS) + '\n')
+        for part_path in sorted(glob.glob(os.path.join(output_dir, 'month=*', '*.csv'))):
+            with open(part_path) as part:
+                next(part)  # Skip the header
+                shutil.copyfileobj(part, out)
+    os.replace(tmp_path, combined_path)
+
+
+# Extract every raw price file in parallel (one worker per file)
+def extract(fact_paths, premise_path, item_path, output_dir, state='Kelantan', item_category='TELUR',
+            workers=None, chunksize=CHUNK_SIZE):
+    premises, items = filter_lookups(premise_path, item_path, state, item_category)
+
+    # Partitions for the months being regenerated are rewritten from scratch
+    os.makedirs(output_dir, exist_ok=True)
+    for path in fact_paths:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        for old_part in glob.glob(os.path.join(output_dir, 'month=*', f"part-{stem}.csv")):
+            os.remove(old_part)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            path: pool.submit(extract_file, path, premises, items, output_dir, chunksize)
+            for path in fact_paths
+        }
+        return {path: future.result() for path, future in futures.items()}
+
+
+# Example:
+#   python extract_pricecatcher.py raw/pricecatcher_2023-*.parquet \
+#       --premises raw/lookup_premise.csv --items raw/lookup_item.csv \
+#       --output telur_partitions --combined "telur kelantan filtered.csv"
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the filtered egg price dataset from raw PriceCatcher files")
+    parser.add_argument('facts', nargs='+', help="Raw price files (CSV or Parquet), e.g. one per month")
+    parser.add_argument('--premises', required=True, help="Premise lookup table")
+    parser.add_argument('--items', required=True, help="Item lookup table")
+    parser.add_argument('--output', default='telur_partitions', help="Folder for the month partitions")
+    parser.add_argument('--combined', help="Also write all partitions into this single CSV")
+    parser.add_argument('--state', default='Kelantan', help="State to keep, or 'all'")
+    parser.add_argument('--item-category', default='TELUR', help="Item category to keep, or 'all'")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunksize', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    state = None if args.state == 'all' else args.state
+    item_category = None if args.item_category == 'all' else args.item_category
+    written = extract(args.facts, args.premises, args.items, args.output, state, item_category,
+                      args.workers, args.chunksize)
+    for path, rows in written.items():
+        print(f"{path}: {rows} rows")
+    if args.combined:
+        combine_partitions(args.output, args.combined)
+        print(f"Combined partitions -> {args.combined}")
@@ -0,0 +1,148 @@
+import os
+
+import pandas as pd
+
+import data_store
+
+# One price series per premise and item
+SERIES_KEY = ['premise_code', 'item_code']
+
+# Lags and rolling windows are counted in observations of the series
+LAGS = (1, 2, 3)
+WINDOWS = (3, 7)
+
+STORE_PATH = os.path.join(data_store.STORE_DIR, "features", "price_features.pkl")
+
+
+# Names of the feature columns for a configuration
+def feature_columns(lags=LAGS, windows=WINDOWS):
+    columns = [f'price_lag_{lag}' for lag in lags]
+    for window in windows:
+        columns += [f'price_roll_mean_{window}', f'price_roll_std_{window}']
+    return columns + ['days_since_last']
+
+
+# Vectorized per-series features. Every feature only looks at earlier observations,
+# so the row's own price never leaks into its features.
+def compute(rows, lags=LAGS, windows=WINDOWS):
+    rows = rows[SERIES_KEY + ['date', 'price']].sort_values(SERIES_KEY + ['date'], kind='stable')
+    rows = rows.reset_index(drop=True)
+    grouped = rows.groupby(SERIES_KEY, sort=False)
+
+    for lag in lags:
+        rows[f'price_lag_{lag}'] = grouped['price'].shift(lag)
+
+    previous = rows['price_lag_1'] if 1 in lags else grouped['price'].shift(1)
+    previous_grouped = previous.groupby([rows[col] for col in SERIES_KEY], sort=False)
+    for window in windows:
+        rolling = previous_grouped.rolling(window, min_periods=1)
+        rows[f'price_roll_mean_{window}'] = rolling.mean().reset_index(level=SERIES_KEY, drop=True)
+        rows[f'price_roll_std_{window}'] = rolling.std().reset_index(level=SERIES_KEY, drop=True)
+
+    rows['days_since_last'] = (rows['date'] - grouped['date'].shift(1)).dt.days
+    return rows
+
+
+# Stored feature table (None if it has not been built or was built with other settings)
+def load(lags=LAGS, windows=WINDOWS):
+    if not os.path.exists(STORE_PATH):
+        return None
+    store = pd.read_pickle(STORE_PATH)
+    if store.attrs.get('config') != [list(lags), list(windows)]:
+        return None
+    return store
+
+
+def _save(store, lags, windows):
+    store.attrs['config'] = [list(lags), list(windows)]
+    os.makedirs(os.path.dirname(STORE_PATH), exist_ok=True)
+    tmp_path = data_store.temp_path(STORE_PATH)
+    store.to_pickle(tmp_path)
+    os.replace(tmp_path, STORE_PATH)
+
+
+# Compute the features for the whole history and write them to disk
+def build(df=None, lags=LAGS, windows=WINDOWS):
+    df = data_store.load() if df is None else df
+    store = compute(df, lags, windows)
+    _save(store, lags, windows)
+    return store
+
+
+# Add features for rows not yet in the store. Series that only gained later dates are
+# extended from the tail of their stored history; series with back-filled dates are recomputed.
+def update(df=None, lags=LAGS, windows=WINDOWS):
+    df = data_store.load() if df is None else df
+    store = load(lags, windows)
+    if store is None:
+        return build(df, lags, windows)
+
+    keys = SERIES_KEY + ['date']
+    rows = df[keys + ['price']]
+    known = rows.merge(store[keys].drop_duplicates(), on=keys, how='left', indicator=True)['_merge'] == 'both'
+    new = rows[~known.to_numpy()]
+    if new.empty:
+        return store
+
+    last_stored = store.groupby(SERIES_KEY)['date'].max().rename('last_stored').reset_index()
+    first_new = new.groupby(SERIES_KEY)['date'].min().rename('first_new').reset_index()
+    affected = first_new.merge(last_stored, on=SERIES_KEY, how='left')
+    backfilled = affected[affected['first_new'] <= affected['last_stored']][SERIES_KEY]
+    appended = affected[~(affected['first_new'] <= affected['last_stored'])][SERIES_KEY]
+
+    lookback = max(list(lags) + list(windows))
+    parts = [store]
+
+    # Forward appends: the last `lookback` stored rows are all the history the new rows need
+    if not appended.empty:
+        tails = store.merge(appended, on=SERIES_KEY).groupby(SERIES_KEY).tail(lookback)
+        new_rows = new.merge(appended, on=SERIES_KEY)
+        extended = compute(pd.concat([tails[keys + ['price']], new_rows]), lags, windows)
+        parts.append(extended.merge(new_rows[keys], on=keys))
+
+    # Back-filled series: recompute the whole series from the source rows
+    if not backfilled.empty:
+        marker = backfilled.assign(_backfilled=True)
+        parts[0] = store.merge(marker, on=SERIES_KEY, how='left')
+        parts[0] = parts[0][parts[0]['_backfilled'].isna()].drop(columns='_backfilled')
+        parts.append(compute(rows.merge(backfilled, on=SERIES_KEY), lags, windows))
+
+    store = pd.concat(parts, ignore_index=True).sort_values(keys, kind='stable').reset_index(drop=True)
+    _save(store, lags, windows)
+    return store
+
+
+# Features of every row of `df` (joined from the store on premise, item and date)
+def features_for(df, lags=LAGS, windows=WINDOWS):
+    store = update(df, lags, windows)
+    keys = SERIES_KEY + ['date']
+    store = store.drop_duplicates(keys, keep='last')
+    return df[keys].merge(store[keys + feature_columns(lags, windows)], on=keys, how='left')
+
+
+# Fill the gaps left by short histories: a missing lag repeats the nearest earlier lag and a
+# missing rolling std is 0. Rows without any earlier price (no price_lag_1) stay missing.
+def fill_short_history(features, lags=LAGS, windows=WINDOWS):
+    features = features.copy()
+    lag_columns = [f'price_lag_{lag}' for lag in sorted(lags)]
+    features[lag_columns] = features[lag_columns].ffill(axis=1)
+    for window in windows:
+        features[f'price_roll_std_{window}'] = features[f'price_roll_std_{window}'].fillna(0)
+    return features
+
+
+# Features for forecasting the next price of each series on `date`, from the stored history
+def next_features(date, lags=LAGS, windows=WINDOWS):
+    store = load(lags, windows)
+    if store is None:
+        store = build(lags=lags, windows=windows)
+    date = pd.Timestamp(date)
+    lookback = max(list(lags) + list(windows))
+
+    history = store[store['date'] < date].groupby(SERIES_KEY).tail(lookback)[SERIES_KEY + ['date', 'price']]
+    # The target rows get no price column (concat fills it with NaN in the history's dtype), and empty
+    # frames are left out: concatenating empty or all-NA entries is deprecated in pandas
+    targets = history.groupby(SERIES_KEY).size().reset_index()[SERIES_KEY].assign(date=date)
+    parts = [frame for frame in (history, targets) if not frame.empty]
+    features = compute(pd.concat(parts) if parts else history, lags, windows)
+    return features[features['date'] == date].drop(columns='price').reset_index(drop=True)
@@ -0,0 +1,60 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import perf
+
+# Total size of cached figure JSON kept per process (least recently used figures are evicted)
+MAX_BYTES = int(os.environ.get('FIGURE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+
+# key -> figure JSON, in least- to most-recently-used order; shared by every session
+_figures = OrderedDict()
+_size = 0
+_lock = threading.Lock()
+stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+
+# Cache key from the chart id, the data version and the widget/filter values
+def make_key(chart_id, version, params=None):
+    return json.dumps([chart_id, version, params], sort_keys=True, default=str)
+
+
+def _store(key, spec):
+    global _size
+    with _lock:
+        if key in _figures:
+            _size -= len(_figures.pop(key))
+        _figures[key] = spec
+        _size += len(spec)
+        while _size > MAX_BYTES and len(_figures) > 1:
+            _, old = _figures.popitem(last=False)
+            _size -= len(old)
+            stats['evictions'] += 1
+
+
+# Figure for (chart_id, version, params): the cached figure dict, or build() on a miss.
+# build() returns a Plotly figure; it is serialized once and reused on later reruns.
+def get(chart_id, version, params, build):
+    key = make_key(chart_id, version, params)
+    with _lock:
+        spec = _figures.get(key)
+        if spec is not None:
+            _figures.move_to_end(key)
+            stats['hits'] += 1
+    if spec is not None:
+        return json.loads(spec)
+
+    stats['misses'] += 1
+    with perf.span('render', chart_id):
+        figure = build()
+    _store(key, figure.to_json())
+    return figure
+
+
+# Drop every cached figure (e.g. after a deploy changes the chart code)
+def clear():
+    global _size
+    with _lock:
+        _figures.clear()
+        _size = 0
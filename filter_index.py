@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+# Columns that get a bitmap per distinct value
+FILTER_COLUMNS = ['district', 'item_code', 'premise_type']
+
+
+# Sort the rows by date once and precompute a boolean bitmap per category value,
+# so a filter resolves to row positions without scanning the frame.
+def build(df, columns=FILTER_COLUMNS):
+    df = df.sort_values('date', kind='stable').reset_index(drop=True)
+    days = df['date'].to_numpy().astype('datetime64[D]').astype(np.int64)
+
+    bitmaps = {}
+    for col in columns:
+        bitmaps[col] = {}
+        for value, positions in df.groupby(col, observed=True).indices.items():
+            mask = np.zeros(len(df), dtype=bool)
+            mask[positions] = True
+            bitmaps[col][value] = mask
+    return {'df': df, 'days': days, 'bitmaps': bitmaps}
+
+
+# Distinct values of an indexed column, sorted
+def values(index, col):
+    return sorted(index['bitmaps'][col])
+
+
+# First and last date in the index
+def date_bounds(index):
+    days = index['days']
+    return pd.Timestamp(days[0], unit='D').date(), pd.Timestamp(days[-1], unit='D').date()
+
+
+# Row positions (into index['df']) for a date range and per-column value lists.
+# An empty or None value list means no filter on that column.
+def select(index, start=None, end=None, **selected):
+    days = index['days']
+    # Binary search on the sorted dates gives the date range as one contiguous slice
+    lo = 0 if start is None else np.searchsorted(days, np.datetime64(start, 'D').astype(np.int64), 'left')
+    hi = len(days) if end is None else np.searchsorted(days, np.datetime64(end, 'D').astype(np.int64), 'right')
+
+    mask = np.ones(hi - lo, dtype=bool)
+    for col, chosen in selected.items():
+        if not chosen:
+            continue
+        col_mask = np.zeros(hi - lo, dtype=bool)
+        for value in chosen:
+            bitmap = index['bitmaps'][col].get(value)
+            if bitmap is not None:
+                col_mask |= bitmap[lo:hi]
+        mask &= col_mask
+    return lo + np.flatnonzero(mask)
+
+
+# Rows of the indexed frame matching the filters
+def rows(index, start=None, end=None, **selected):
+    return index['df'].iloc[select(index, start, end, **selected)]
@@ -0,0 +1,79 @@
+import json
+import os
+import socket
+import threading
+
+# Where inference_server.py listens: host:port or unix:/path/to.sock
+ADDRESS = os.environ.get('INFERENCE_ADDRESS', '127.0.0.1:8765')
+TIMEOUT = float(os.environ.get('INFERENCE_TIMEOUT', 5))
+
+# One open connection per thread (each Streamlit session runs in its own thread)
+_local = threading.local()
+
+
+def _connect():
+    if ADDRESS.startswith('unix:'):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(TIMEOUT)
+        sock.connect(ADDRESS[len('unix:'):])
+    else:
+        host, port = ADDRESS.rsplit(':', 1)
+        sock = socket.create_connection((host, int(port)), timeout=TIMEOUT)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return sock, sock.makefile('rwb')
+
+
+def _close():
+    connection = getattr(_local, 'connection', None)
+    _local.connection = None
+    if connection is not None:
+        connection[1].close()
+        connection[0].close()
+
+
+# Send one JSON request and return the decoded response; reconnects once if the server restarted
+def request(payload):
+    message = json.dumps(payload, default=lambda value: value.item()).encode() + b'\n'
+    for attempt in range(2):
+        if getattr(_local, 'connection', None) is None:
+            _local.connection = _connect()
+        stream = _local.connection[1]
+        try:
+            stream.write(message)
+            stream.flush()
+            line = stream.readline()
+            if not line:
+                raise ConnectionError("Inference server closed the connection")
+            break
+        except OSError:
+            _close()
+            if attempt:
+                raise
+
+    response = json.loads(line)
+    if 'error' in response:
+        raise ValueError(response['error'])
+    return response
+
+
+# Predictions for a list of row dicts with item_code, premise_type, district and month
+def predict_rows(name, rows):
+    return request({'model': name, 'rows': rows})['predictions']
+
+
+# Predicted price for one input. Uses the inference server when it is running,
+# otherwise predicts in this process like before. Segment models are always predicted in this process.
+def predict(name, item_code, premise_type, district, month, segment=None):
+    row = {'item_code': item_code, 'premise_type': premise_type, 'district': district, 'month': int(month)}
+    if segment is not None:
+        import model_registry
+        import pandas as pd
+        return float(model_registry.get_pipeline(name, segment).predict(pd.DataFrame([row]))[0])
+
+    try:
+        return predict_rows(name, [row])[0]
+    except OSError:
+        _close()
+
+    import prediction_table
+    return prediction_table.predict(name, item_code, premise_type, district, month)
@@ -0,0 +1,174 @@
+import argparse
+import asyncio
+import json
+import time
+
+import pandas as pd
+
+import compiled_model
+import inference_client
+import model_registry
+import prediction_table
+
+# Defaults for coalescing concurrent requests into one predict call per model
+MAX_WAIT_MS = 2.0
+MAX_BATCH_ROWS = 256
+
+COLUMNS = ['item_code', 'premise_type', 'district', 'month']
+
+stats = {'requests': 0, 'rows': 0, 'batches': 0, 'largest_batch': 0, 'errors': 0}
+
+
+# Check one request's rows and build its frame, so a bad request fails on its own
+# instead of failing the batch it would have joined
+def request_frame(rows):
+    if not isinstance(rows, list):
+        raise ValueError("'rows' must be a list of objects")
+    for i, row in enumerate(rows):
+        if not isinstance(row, dict):
+            raise ValueError(f"Row {i} is not an object")
+        missing = [col for col in COLUMNS if col not in row]
+        if missing:
+            raise ValueError(f"Row {i} is missing {', '.join(missing)}")
+    frame = pd.DataFrame(rows, columns=COLUMNS)
+    try:
+        frame['month'] = pd.to_numeric(frame['month'])
+    except (TypeError, ValueError):
+        raise ValueError("'month' must be a number") from None
+    return frame
+
+
+# Score each request of a failed batch on its own, so only the requests that cause the error fail
+def _score_separately(name, batch):
+    results = []
+    for frame, _ in batch:
+        try:
+            results.append(prediction_table.predict_frame(name, frame))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+# Collect queued requests for one model until the batch is full or max_wait has passed,
+# score them with a single vectorized call and hand each request its slice of the result
+async def _batch_loop(name, queue, max_wait, max_rows):
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await queue.get()]
+        rows = len(batch[0][0])
+        deadline = loop.time() + max_wait
+        while rows < max_rows:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            batch.append(item)
+            rows += len(item[0])
+
+        frame = pd.concat([part for part, _ in batch], ignore_index=True)
+        try:
+            # Scoring runs off the event loop so new requests keep queueing meanwhile
+            predictions = await loop.run_in_executor(None, prediction_table.predict_frame, name, frame)
+            results, start = [], 0
+            for part, _ in batch:
+                results.append(predictions[start:start + len(part)])
+                start += len(part)
+        except Exception:
+            results = await loop.run_in_executor(None, _score_separately, name, batch)
+
+        stats['batches'] += 1
+        stats['largest_batch'] = max(stats['largest_batch'], rows)
+        for result, (_, future) in zip(results, batch):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                stats['errors'] += 1
+                future.set_exception(result)
+            else:
+                future.set_result([float(p) for p in result])
+
+
+# One connection: newline-delimited JSON requests, answered in order.
+# {"model": "RF", "rows": [{"item_code": 118, ...}]} -> {"predictions": [...]}
+async def _handle(reader, writer, queues):
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                request = json.loads(line)
+                if request.get('stats'):
+                    response = {'stats': stats}
+                else:
+                    name = request['model']
+                    if name not in queues:
+                        raise ValueError(f"Unknown model '{name}'")
+                    frame = request_frame(request['rows'])
+                    future = loop.create_future()
+                    stats['requests'] += 1
+                    stats['rows'] += len(frame)
+                    await queues[name].put((frame, future))
+                    response = {'predictions': await future}
+            except Exception as e:
+                response = {'error': str(e)}
+            writer.write(json.dumps(response).encode() + b'\n')
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+# Run the server on `address` (host:port or unix:/path/to.sock) until cancelled
+async def serve(address=inference_client.ADDRESS, max_wait_ms=MAX_WAIT_MS, max_batch_rows=MAX_BATCH_ROWS):
+    # Load the tables and the compiled models behind them once, before the first request arrives
+    for name in model_registry.MODEL_FILES:
+        if prediction_table.load_table(name) is None:
+            prediction_table.compile_table(name)
+        compiled_model.load(name)
+
+    queues = {name: asyncio.Queue() for name in model_registry.MODEL_FILES}
+    batchers = [
+        asyncio.create_task(_batch_loop(name, queue, max_wait_ms / 1000, max_batch_rows))
+        for name, queue in queues.items()
+    ]
+
+    handler = lambda reader, writer: _handle(reader, writer, queues)
+    if address.startswith('unix:'):
+        server = await asyncio.start_unix_server(handler, path=address[len('unix:'):])
+    else:
+        host, port = address.rsplit(':', 1)
+        server = await asyncio.start_server(handler, host, int(port))
+
+    print(f"Inference server listening on {address} "
+          f"(max wait {max_wait_ms} ms, batches of up to {max_batch_rows} rows)", flush=True)
+    started = time.time()
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        for task in batchers:
+            task.cancel()
+        print(f"Served {stats['requests']} requests in {stats['batches']} batches "
+              f"over {time.time() - started:.0f}s", flush=True)
+
+
+# Example: python inference_server.py --address unix:/tmp/telur.sock --max-wait-ms 5
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve price predictions with cross-session micro-batching")
+    parser.add_argument('--address', default=inference_client.ADDRESS,
+                        help="host:port or unix:/path/to.sock (default from INFERENCE_ADDRESS)")
+    parser.add_argument('--max-wait-ms', type=float, default=MAX_WAIT_MS,
+                        help="Longest time a request waits for others to share its batch")
+    parser.add_argument('--batch-size', type=int, default=MAX_BATCH_ROWS,
+                        help="Rows per batch before it is scored without waiting")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.address, args.max_wait_ms, args.batch_size))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,254 @@
+import argparse
+import json
+import os
+
+import pandas as pd
+
+import anomaly_detector
+import data_store
+import feature_store
+import model_registry
+import price_panel
+import rollup_cube
+from extract_pricecatcher import format_dates
+
+# Rows are unique on these columns; a new row with an existing key replaces the old one
+KEY = ['date', 'premise_code', 'item_code']
+
+# Per-month rollup-cube histograms live next to the columnar bundles; the descriptive page merges
+# them into its cube. The version file records which data version they were built from.
+PARTITION_DIR = os.path.join(data_store.STORE_DIR, "partitions")
+PARTITION_VERSION = os.path.join(PARTITION_DIR, "version.txt")
+REFIT_FLAGS = os.path.join(data_store.STORE_DIR, "refit_flags.json")
+
+# Models trained on the whole history, which go stale when any month changes (tune_models.py
+# --install clears a model's flags)
+MODELS = list(model_registry.MODEL_FILES)
+
+
+# Month partition label of each date, e.g. '2024-05'
+def month_label(dates):
+    return dates.dt.strftime('%Y-%m')
+
+
+# Parse new rows from a CSV path or DataFrame; accepts m/d/yyyy or ISO dates
+def read_new_rows(rows):
+    new = pd.read_csv(rows) if isinstance(rows, str) else rows.copy()
+    try:
+        new['date'] = pd.to_datetime(new['date'], format=data_store.DATE_FORMAT)
+    except ValueError:
+        new['date'] = pd.to_datetime(new['date'])
+    return new.drop_duplicates(KEY, keep='last')
+
+
+# Rollup-cube histogram of one month (see rollup_cube)
+def month_aggregates(rows):
+    return rollup_cube.histogram(rows)
+
+
+def _write_json(path, value):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = data_store.temp_path(path)
+    with open(tmp_path, 'w') as f:
+        json.dump(value, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+# Recompute the aggregate partitions for the given months only
+def update_partitions(df, months):
+    labels = month_label(df['date'])
+    table_dir = os.path.join(PARTITION_DIR, 'aggregates')
+    os.makedirs(table_dir, exist_ok=True)
+    for month in months:
+        rows = df[labels == month]
+        path = os.path.join(table_dir, f"{month}.pkl")
+        if rows.empty:
+            if os.path.exists(path):
+                os.remove(path)
+            continue
+        tmp_path = data_store.temp_path(path)
+        month_aggregates(rows).to_pickle(tmp_path)
+        os.replace(tmp_path, path)
+
+
+# Read every partition of a derived table into one frame.
+# rollup_cube.from_hist(read_partitions('aggregates')) gives the cube for the whole history.
+def read_partitions(table):
+    table_dir = os.path.join(PARTITION_DIR, table)
+    if not os.path.isdir(table_dir):
+        return None
+    parts = []
+    for name in sorted(os.listdir(table_dir)):
+        if name.endswith('.pkl'):
+            parts.append(pd.read_pickle(os.path.join(table_dir, name)).assign(partition=name[:-4]))
+    return pd.concat(parts, ignore_index=True) if parts else None
+
+
+# Months already materialised for a derived table
+def partition_months(table):
+    table_dir = os.path.join(PARTITION_DIR, table)
+    if not os.path.isdir(table_dir):
+        return []
+    return sorted(name[:-4] for name in os.listdir(table_dir) if name.endswith('.pkl'))
+
+
+# True if the aggregate partitions were written with other cube dimensions (they need a rebuild)
+def aggregates_stale():
+    months = partition_months('aggregates')
+    if not months:
+        return True
+    hist = pd.read_pickle(os.path.join(PARTITION_DIR, 'aggregates', f"{months[0]}.pkl"))
+    return list(hist.columns) != rollup_cube.DIMENSIONS + ['price_bin', 'n']
+
+
+# Data version the partitions were built from (None if unknown)
+def partitions_version():
+    if not os.path.exists(PARTITION_VERSION):
+        return None
+    with open(PARTITION_VERSION) as f:
+        return f.read().strip()
+
+
+def _set_partitions_version(source):
+    tmp_path = data_store.temp_path(PARTITION_VERSION)
+    with open(tmp_path, 'w') as f:
+        f.write(data_store.data_version(source))
+    os.replace(tmp_path, PARTITION_VERSION)
+
+
+# True if the partitions match the current source and cube dimensions
+def partitions_current(source=data_store.SOURCE):
+    return partitions_version() == data_store.data_version(source) and not aggregates_stale()
+
+
+# Rebuild the partitions if the source changed without going through append()
+def ensure_partitions(source=data_store.SOURCE):
+    if not partitions_current(source):
+        rebuild_partitions(source)
+
+
+# Mark models as needing a refit because these months changed
+def flag_refit(months, models=MODELS):
+    flags = needs_refit()
+    for name in models:
+        flags[name] = sorted(set(flags.get(name, [])) | set(months))
+    _write_json(REFIT_FLAGS, flags)
+
+
+# Models that need refitting -> months changed since their last fit
+def needs_refit():
+    if not os.path.exists(REFIT_FLAGS):
+        return {}
+    with open(REFIT_FLAGS) as f:
+        return json.load(f)
+
+
+# Call after retraining a model
+def clear_refit(name):
+    flags = needs_refit()
+    if flags.pop(name, None) is not None:
+        _write_json(REFIT_FLAGS, flags)
+
+
+# Build every partition from scratch (first run, or after the source was replaced)
+def rebuild_partitions(source=data_store.SOURCE):
+    df = data_store.load(source)
+    months = sorted(month_label(df['date']).unique())
+    # Months left over from an older version of the source
+    for month in set(partition_months('aggregates')) - set(months):
+        os.remove(os.path.join(PARTITION_DIR, 'aggregates', f"{month}.pkl"))
+    update_partitions(df, months)
+    _set_partitions_version(source)
+    return months
+
+
+# Write rows back in the source CSV's layout and date format
+def _to_source_layout(rows, columns):
+    rows = rows.copy()
+    rows['date'] = format_dates(rows['date'])
+    return rows[columns]
+
+
+# Append new rows to the source CSV, deduplicating on (date, premise_code, item_code),
+# then refresh the derived tables for the affected months and flag stale models.
+def append(rows, source=data_store.SOURCE):
+    new = read_new_rows(rows)
+    columns = list(pd.read_csv(source, nrows=0).columns)
+    missing = [col for col in columns if col not in new.columns]
+    if missing:
+        raise ValueError(f"New rows are missing columns: {', '.join(missing)}")
+
+    # Compare only against existing rows in the months being touched
+    existing = data_store.load(source, columns=KEY + ['price'])
+    existing = existing[month_label(existing['date']).isin(set(month_label(new['date'])))]
+    merged = new.merge(existing, on=KEY, how='left', suffixes=('', '_old'), indicator=True)
+    is_new = (merged['_merge'] == 'left_only').to_numpy()
+    # The store keeps price as float32, so compare at that precision
+    price_differs = merged['price'].astype('float32') != merged['price_old']
+    is_changed = ((merged['_merge'] == 'both') & price_differs).to_numpy()
+
+    appended = new[is_new]
+    changed = new[is_changed]
+    summary = {
+        'appended': len(appended),
+        'updated': len(changed),
+        'duplicates': len(new) - len(appended) - len(changed),
+        'partitions': sorted(set(month_label(pd.concat([appended['date'], changed['date']])))),
+    }
+    if not summary['partitions']:
+        summary['refit'] = []
+        return summary
+
+    # Only partitions that matched the source before this append can be updated month by month
+    partitions_were_current = partitions_current(source)
+    if changed.empty:
+        # Fast path: plain append to the end of the CSV, which extends the columnar bundle in place of
+        # reparsing the file
+        data_store.append_csv(_to_source_layout(appended, columns), source)
+    else:
+        # Replace the rows whose key changed, then rewrite the file atomically
+        full = pd.read_csv(source)
+        full_dates = pd.to_datetime(full['date'], format=data_store.DATE_FORMAT)
+        full_keys = pd.MultiIndex.from_arrays([full_dates, full['premise_code'], full['item_code']])
+        changed_keys = pd.MultiIndex.from_frame(changed[KEY])
+        full = full[~full_keys.isin(changed_keys)]
+        updated = pd.concat([full, _to_source_layout(pd.concat([changed, appended]), columns)])
+        tmp_path = data_store.temp_path(source)
+        updated.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, source)
+
+    # Refresh only the partitions for the months that changed
+    df = data_store.load(source)
+    if partitions_were_current:
+        update_partitions(df, summary['partitions'])
+        _set_partitions_version(source)
+    else:
+        rebuild_partitions(source)
+
+    # Extend the price-history features with the new dates
+    feature_store.update(df)
+
+    # Re-aggregate the changed months of the price panel and join them with population and income
+    price_panel.update(df, source)
+
+    # Score the new prices against each series' running statistics
+    scored = anomaly_detector.catch_up(source)
+    summary['anomalies'] = int(scored['anomaly'].sum()) if len(scored) else 0
+
+    flag_refit(summary['partitions'])
+    summary['refit'] = sorted(needs_refit())
+    return summary
+
+
+# Example: python ingest.py new_month.csv
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Append new monthly price rows to the egg dataset")
+    parser.add_argument('rows', help="CSV with the same columns as the source dataset")
+    parser.add_argument('--source', default=data_store.SOURCE)
+    args = parser.parse_args()
+
+    result = append(args.rows, args.source)
+    print(f"Appended {result['appended']} rows, updated {result['updated']}, skipped {result['duplicates']} duplicates")
+    print(f"Refreshed partitions: {', '.join(result['partitions']) or 'none'}")
+    print(f"Models to refit: {', '.join(result['refit']) or 'none'}")
+    print(f"Unusual prices flagged: {result.get('anomalies', 0)}")
@@ -1,8 +1,14 @@
 import streamlit as st
 
+import warmup
+
 # Set page configuration for a more dynamic experience
 st.set_page_config(page_title="Egg Distribution Insights - Kelantan", layout="wide", initial_sidebar_state="expanded")
 
+# Load the data, models and heavy libraries in the background so the first page visit is fast
+warmup.start()
+warmup.indicator()
+
 # Title and introduction with a welcoming, engaging tone
 st.title("🥚 Kelantan Egg Distribution & Price Prediction Tool")
 
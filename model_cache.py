@@ -0,0 +1,127 @@
+import hashlib
+import os
+from importlib.metadata import version
+
+import joblib
+import pandas as pd
+
+import data_store
+
+# Folder where fitted models and their metrics are stored between runs
+CACHE_DIR = ".model_cache"
+
+# Number of cached training runs and CV results to keep on disk (oldest are evicted first)
+MAX_ENTRIES = 8
+
+# Other artifacts live in a subfolder per namespace with a cap of their own, so computing them
+# never evicts a training run. Explanations have room for the shipped pipelines' (precomputed
+# by `python explain.py`) plus the page's recent ones.
+NAMESPACES = {'explanations': 12}
+
+# In-process copy of the artifacts so reruns do not even touch the disk: namespace -> key -> artifact
+_memory = {}
+stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+
+
+# Hash the content of a DataFrame/Series (values only, index ignored)
+def hash_frame(data):
+    hashed = pd.util.hash_pandas_object(pd.DataFrame(data), index=False)
+    return hashlib.sha256(hashed.values.tobytes()).hexdigest()
+
+
+# Hash the model names, classes and hyperparameters
+def hash_models(models):
+    h = hashlib.sha256()
+    for name, model in models.items():
+        h.update(name.encode())
+        h.update(type(model).__name__.encode())
+        h.update(repr(sorted(model.get_params().items())).encode())
+    return h.hexdigest()
+
+
+# Build the cache key from the data, the model spec and any extra settings
+def make_key(*frames, models=None, **params):
+    h = hashlib.sha256()
+    # Pickles from another scikit-learn version are not safe to reuse
+    # (read from the package metadata, so building a key does not import scikit-learn)
+    h.update(version('scikit-learn').encode())
+    for frame in frames:
+        h.update(hash_frame(frame).encode())
+    if models is not None:
+        h.update(hash_models(models).encode())
+    h.update(repr(sorted(params.items())).encode())
+    return h.hexdigest()[:24]
+
+
+# Folder and entry cap of a namespace (None is the default one for training runs and CV results)
+def _namespace(namespace):
+    if namespace is None:
+        return CACHE_DIR, MAX_ENTRIES
+    return os.path.join(CACHE_DIR, namespace), NAMESPACES[namespace]
+
+
+# Remove the least recently used entries of a namespace above its cap
+def evict(namespace=None, keep=None):
+    cache_dir, max_entries = _namespace(namespace)
+    keep = max_entries if keep is None else keep
+    if not os.path.isdir(cache_dir):
+        return
+    paths = [os.path.join(cache_dir, f) for f in os.listdir(cache_dir) if f.endswith(".joblib")]
+    paths.sort(key=os.path.getmtime, reverse=True)
+    for path in paths[keep:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+# Keep the in-process copy bounded as well
+def _remember(key, artifact, namespace=None):
+    memory = _memory.setdefault(namespace, {})
+    if len(memory) >= _namespace(namespace)[1]:
+        memory.pop(next(iter(memory)))
+    memory[key] = artifact
+
+
+# Return the cached artifact for `key`, or None if it has not been computed
+def get(key, namespace=None):
+    memory = _memory.get(namespace, {})
+    if key in memory:
+        stats['memory_hits'] += 1
+        return memory[key]
+
+    path = os.path.join(_namespace(namespace)[0], f"{key}.joblib")
+    if os.path.exists(path):
+        try:
+            artifact = joblib.load(path)
+            # Touch the file so eviction treats it as recently used
+            os.utime(path)
+            stats['disk_hits'] += 1
+            _remember(key, artifact, namespace)
+            return artifact
+        except Exception:
+            # Corrupt or incompatible file: treat it as missing so it is rebuilt
+            pass
+    return None
+
+
+# Return the cached artifact for `key`, or compute it with `compute_fn` and store it
+def load_or_compute(key, compute_fn, namespace=None):
+    artifact = get(key, namespace)
+    if artifact is not None:
+        return artifact
+
+    stats['misses'] += 1
+    artifact = compute_fn()
+
+    # Write to a temporary file first so other workers never read a partial file
+    cache_dir = _namespace(namespace)[0]
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f"{key}.joblib")
+    tmp_path = data_store.temp_path(path)
+    joblib.dump(artifact, tmp_path)
+    os.replace(tmp_path, path)
+    evict(namespace)
+
+    _remember(key, artifact, namespace)
+    return artifact
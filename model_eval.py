@@ -0,0 +1,114 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.metrics import mean_absolute_error, mean_squared_error
+from sklearn.model_selection import KFold
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+
+
+# Shuffled k-fold splits over row positions
+def kfold_splits(n_rows, n_splits=5, random_state=42):
+    kf = KFold(n_splits=n_splits, shuffle=True, random_state=random_state)
+    return list(kf.split(np.arange(n_rows)))
+
+
+# Walk-forward splits: train on every date before a block, test on that block.
+# Splitting on unique dates keeps rows from the same day on one side of the split.
+def walk_forward_splits(dates, n_splits=5):
+    dates = pd.to_datetime(pd.Series(dates)).to_numpy()
+    unique_dates = np.unique(dates)
+    if len(unique_dates) < n_splits + 1:
+        raise ValueError(f"Need at least {n_splits + 1} distinct dates for {n_splits} walk-forward folds")
+
+    blocks = np.array_split(unique_dates, n_splits + 1)
+    splits = []
+    for block in blocks[1:]:
+        train_idx = np.flatnonzero(dates < block[0])
+        test_idx = np.flatnonzero((dates >= block[0]) & (dates <= block[-1]))
+        splits.append((train_idx, test_idx))
+    return splits
+
+
+# Fit one model on one fold (runs inside a worker process)
+def _fit_one(name, model, X, y, fold, train_idx, test_idx):
+    # Scale inside the fold so the test rows never leak into the scaler
+    pipeline = make_pipeline(StandardScaler(), clone(model))
+
+    start = time.perf_counter()
+    pipeline.fit(X[train_idx], y[train_idx])
+    fit_seconds = time.perf_counter() - start
+
+    y_pred = pipeline.predict(X[test_idx])
+    return {
+        'Model': name,
+        'Fold': fold,
+        'MAE': mean_absolute_error(y[test_idx], y_pred),
+        'MSE': mean_squared_error(y[test_idx], y_pred),
+        'Fit Time (s)': fit_seconds,
+    }
+
+
+# Mean and two-sided confidence interval (Student t) of a metric across folds
+def confidence_interval(values, confidence=0.95):
+    values = np.asarray(values, dtype=float)
+    mean = values.mean()
+    if len(values) < 2:
+        return mean, mean, mean
+    # scipy.stats is slow to import and only needed once results are in
+    from scipy import stats
+    half_width = stats.t.ppf((1 + confidence) / 2, len(values) - 1) * values.std(ddof=1) / np.sqrt(len(values))
+    return mean, mean - half_width, mean + half_width
+
+
+# Run the model x fold grid on a process pool and summarise the results.
+# scheme is 'kfold' or 'walk_forward' (the latter needs `dates`).
+def evaluate(models, X, y, dates=None, scheme='kfold', n_splits=5, n_jobs=-1, confidence=0.95):
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    if scheme == 'kfold':
+        splits = kfold_splits(len(X), n_splits)
+    elif scheme == 'walk_forward':
+        if dates is None:
+            raise ValueError("Walk-forward evaluation needs the date column")
+        splits = walk_forward_splits(dates, n_splits)
+    else:
+        raise ValueError(f"Unknown split scheme: {scheme}")
+
+    tasks = [
+        delayed(_fit_one)(name, model, X, y, fold, train_idx, test_idx)
+        for name, model in models.items()
+        for fold, (train_idx, test_idx) in enumerate(splits)
+    ]
+
+    start = time.perf_counter()
+    fold_results = Parallel(n_jobs=n_jobs, backend='loky')(tasks)
+    wall_seconds = time.perf_counter() - start
+    folds_df = pd.DataFrame(fold_results)
+
+    summary = []
+    for name, group in folds_df.groupby('Model', sort=False):
+        mae, mae_low, mae_high = confidence_interval(group['MAE'], confidence)
+        mse, mse_low, mse_high = confidence_interval(group['MSE'], confidence)
+        summary.append({
+            'Model': name,
+            'MAE': mae, 'MAE CI Low': mae_low, 'MAE CI High': mae_high,
+            'MSE': mse, 'MSE CI Low': mse_low, 'MSE CI High': mse_high,
+            'Mean Fit Time (s)': group['Fit Time (s)'].mean(),
+        })
+
+    # Timing achieved: total fit time over wall-clock is the effective parallel speedup
+    total_fit_seconds = folds_df['Fit Time (s)'].sum()
+    timing = {
+        'wall_seconds': wall_seconds,
+        'total_fit_seconds': total_fit_seconds,
+        'n_fits': len(tasks),
+        'n_workers': os.cpu_count() if n_jobs == -1 else n_jobs,
+        'speedup': total_fit_seconds / wall_seconds if wall_seconds > 0 else float('nan'),
+    }
+    return pd.DataFrame(summary), folds_df, timing
@@ -0,0 +1,65 @@
+import os
+import threading
+
+import joblib
+
+import perf
+
+# Pickled pipelines shipped with the app, by short model name
+MODEL_FILES = {
+    'DT': 'dt_model_pipeline.pkl',
+    'LR': 'lr_model_pipeline.pkl',
+    'RF': 'rf_model_pipeline (3).pkl',
+    'SVM': 'svm_model_pipeline.pkl',
+}
+
+# Loaded pipelines shared by every session in this process: (name, segment) -> (path, mtime, pipeline)
+_pipelines = {}
+_lock = threading.Lock()
+
+
+# Pickle of a model: the shipped one, or the current version trained for a segment (see segment_training.py)
+def model_path(name, segment=None):
+    if segment is None:
+        return MODEL_FILES[name]
+    import segment_training
+    return segment_training.model_path(segment, name)
+
+
+# Return the pipeline for `name`, loading it on first use or when the pickle changed
+def get_pipeline(name, segment=None):
+    path = model_path(name, segment)
+    mtime = os.path.getmtime(path)
+
+    entry = _pipelines.get((name, segment))
+    if entry is not None and entry[:2] == (path, mtime):
+        return entry[2]
+
+    with _lock:
+        # Another session may have loaded it while we waited for the lock
+        entry = _pipelines.get((name, segment))
+        if entry is not None and entry[:2] == (path, mtime):
+            return entry[2]
+
+        # Memory-map large numpy arrays so several workers share the same pages
+        with perf.span('load', f"joblib.load {name}" + (f" ({segment})" if segment else "")):
+            pipeline = joblib.load(path, mmap_mode='r')
+        _pipelines[(name, segment)] = (path, mtime, pipeline)
+        return pipeline
+
+
+# The fitted OneHotEncoder inside a pipeline
+def get_encoder(name, segment=None):
+    preprocessor = get_pipeline(name, segment).named_steps['preprocessor']
+    return preprocessor.named_transformers_['cat']
+
+
+# Categories of the encoder, in the order of its columns (item_code, premise_type, district)
+def get_categories(name, segment=None):
+    return get_encoder(name, segment).categories_
+
+
+# Categories keyed by column name
+def get_category_map(name, segment=None):
+    encoder = get_encoder(name, segment)
+    return dict(zip(encoder.feature_names_in_, encoder.categories_))
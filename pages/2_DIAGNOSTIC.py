@@ -1,16 +1,40 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 
-# Load the datasets
-income_state = pd.read_csv('hh_income_state.csv')
-population_state = pd.read_csv('population_state.csv')
+import chart_data
+import data_store
+import figure_cache
+import perf
+import price_panel
+import state_data
+import warmup
+
+# State shown on this page
+STATE = 'Kelantan'
+
+# Load one state's rows; the datasets are stored partitioned by state, so other states are never parsed
+@st.cache_data
+def load_state_rows(source, state, version):
+    perf.count('load_state_rows.miss')
+    return state_data.load_state(source, state)
+
+# Load a year-level summary precomputed for one state
+@st.cache_data
+def load_state_summary(name, state, version):
+    perf.count('load_state_summary.miss')
+    return state_data.load_summary(name, state)
+
+# Figures and data are cached per data version, so unchanged charts are not rebuilt on rerun
+income_version = data_store.data_version('hh_income_state.csv')
+population_version = data_store.data_version('population_state.csv')
 
 # Set up the page title and layout
 st.set_page_config(page_title="Kelantan Population and Income Insights", layout="wide")
 
 # Title for the app
 st.title("📊 Kelantan Population and Income Insights")
+perf.page('2_DIAGNOSTIC')
+warmup.start()
 
 # Description of the app
 st.markdown("""
@@ -21,99 +45,138 @@ st.markdown("""
 
 # --- Population Over Time ---
 st.header("📈 Population of Kelantan Over Time")
-# Convert 'date' to datetime in the original DataFrame to avoid warnings
-population_state['date'] = pd.to_datetime(population_state['date'], errors='coerce')
-
-# Filter data for Kelantan
-kelantan_population = population_state[population_state['state'] == 'Kelantan']
-
-# Plot the population of Kelantan over time using Plotly
-fig_population = px.line(kelantan_population, x=kelantan_population['date'].dt.year, y='population',
-                         title='Population of Kelantan Over Time', labels={'date': 'Year', 'population': 'Population'})
-
-# Show the plot
-st.plotly_chart(fig_population)
+# Population rows for Kelantan only
+try:
+    with perf.span('load', 'load_state_rows'):
+        kelantan_population = load_state_rows('population_state.csv', STATE, population_version)
+except Exception as e:
+    kelantan_population = None
+    st.error(f"Unable to load population data: {e}")
+
+if kelantan_population is not None:
+    def build_population():
+        # Downsample the series to the chart payload budget before sending it to the browser
+        population_series = chart_data.downsample_lines(
+            kelantan_population.assign(year=kelantan_population['date'].dt.year), 'year', 'population')
+
+        # Plot the population of Kelantan over time using Plotly
+        return px.line(population_series, x='year', y='population',
+                       title='Population of Kelantan Over Time', labels={'year': 'Year', 'population': 'Population'})
+
+    # Show the plot
+    st.plotly_chart(figure_cache.get('population', population_version, STATE, build_population))
 
 # --- Population Ethnicity Over Time ---
 st.header("🧑‍🤝‍🧑 Ethnicity Distribution in Kelantan Over Time")
-# Group data by ethnicity and year
-ethnicity_population = kelantan_population.groupby(['ethnicity', kelantan_population['date'].dt.year])['population'].sum().reset_index()
+def build_ethnicity():
+    # Population by ethnicity and year (precomputed per state)
+    ethnicity_population = load_state_summary('ethnicity_by_year', STATE, population_version)
+    ethnicity_population = chart_data.downsample_lines(ethnicity_population, 'year', 'population', color='ethnicity')
 
-# Plot the population ethnicity over time using Plotly
-fig_ethnicity = px.line(ethnicity_population, x='date', y='population', color='ethnicity',
-                        title='Population Ethnicity in Kelantan Over Time', labels={'date': 'Year', 'population': 'Population'})
+    # Plot the population ethnicity over time using Plotly
+    return px.line(ethnicity_population, x='year', y='population', color='ethnicity',
+                   title='Population Ethnicity in Kelantan Over Time', labels={'year': 'Year', 'population': 'Population'})
 
-# Show the plot
-st.plotly_chart(fig_ethnicity)
+# Show the plot (the summary is built from the same population file, so it can be missing too)
+try:
+    st.plotly_chart(figure_cache.get('ethnicity', population_version, STATE, build_ethnicity))
+except Exception as e:
+    st.error(f"Unable to load population data: {e}")
 
 # --- Income Over Time ---
 st.header("💵 Mean and Median Income in Kelantan Over Time")
-# Convert 'date' column to datetime objects
-income_state['date'] = pd.to_datetime(income_state['date'], errors='coerce')
+def build_income():
+    # Mean and median income by year (precomputed per state)
+    kelantan_income_summary = load_state_summary('income_by_year', STATE, income_version)
 
-# Filter data for Kelantan
-kelantan_income = income_state[income_state['state'] == 'Kelantan']
-
-# Group data by year and calculate mean and median income
-kelantan_income_summary = kelantan_income.groupby(kelantan_income['date'].dt.year)[['income_mean', 'income_median']].mean().reset_index()
-
-# Plot the income trends using Plotly
-fig_income = px.line(kelantan_income_summary, x='date', y=['income_mean', 'income_median'],
-                     title='Mean and Median Income in Kelantan Over Time',
-                     labels={'date': 'Year', 'value': 'Income (MYR)', 'variable': 'Income Type'},
-                     line_shape='linear')
+    # Plot the income trends using Plotly
+    return px.line(kelantan_income_summary, x='year', y=['income_mean', 'income_median'],
+                   title='Mean and Median Income in Kelantan Over Time',
+                   labels={'year': 'Year', 'value': 'Income (MYR)', 'variable': 'Income Type'},
+                   line_shape='linear')
 
 # Show the plot
-st.plotly_chart(fig_income)
-
-import pandas as pd
-import streamlit as st
-import plotly.express as px
+try:
+    st.plotly_chart(figure_cache.get('income', income_version, STATE, build_income))
+except Exception as e:
+    st.error(f"Unable to load income data: {e}")
 
 # Streamlit app title
 st.title("Population of Kelantan by District Over Time 📊")
 
 # Function to load and preprocess the dataset
 @st.cache_data
-def load_data():
+def load_data(version):
+    perf.count('load_data.miss')
     try:
-        # Load the population data
-        population_district = pd.read_csv('population_district.csv')
-
-        # Convert the 'date' column to datetime objects
-        population_district['date'] = pd.to_datetime(population_district['date'])
+        # Population by district and year for Kelantan (precomputed from the state partition)
+        kelantan_population_by_district = state_data.load_summary('district_by_year', STATE)
 
-        # Filter data for Kelantan
-        kelantan_population = population_district[population_district['state'] == 'Kelantan']
-
-        # Group data by district and year, then sum the population
-        kelantan_population_by_district = kelantan_population.groupby(['district', kelantan_population['date'].dt.year])['population'].sum().reset_index()
-        kelantan_population_by_district.columns = ['district', 'year', 'population']  # Renaming columns for clarity
+        # Keep the most populous districts on the axis and fold the rest into "Other"
+        kelantan_population_by_district = chart_data.top_n(kelantan_population_by_district, 'district', rank_by='population')
         return kelantan_population_by_district
     except Exception as e:
         st.error(f"Error loading data: {e}")
         return None
 
 # Load the data
-df = load_data()
+district_version = data_store.data_version('population_district.csv')
+with perf.span('load', 'load_data'):
+    df = load_data(district_version)
 
 if df is not None:
-    # Create the Plotly bar chart
-    fig = px.bar(df, 
-                 x='district', 
-                 y='population', 
-                 color='year', 
-                 labels={'district': 'District', 'population': 'Population', 'year': 'Year'},
-                 title="Population of Kelantan by District Over Time",
-                 barmode='group',  # Group bars by year
-                 color_discrete_sequence=px.colors.qualitative.Set3)
-
-    # Rotate x-axis labels for better readability
-    fig.update_xaxes(tickangle=45)
+    def build_district():
+        # Create the Plotly bar chart
+        fig = px.bar(df, 
+                     x='district', 
+                     y='population', 
+                     color='year', 
+                     labels={'district': 'District', 'population': 'Population', 'year': 'Year'},
+                     title="Population of Kelantan by District Over Time",
+                     barmode='group',  # Group bars by year
+                     color_discrete_sequence=px.colors.qualitative.Set3)
+
+        # Rotate x-axis labels for better readability
+        fig.update_xaxes(tickangle=45)
+        return fig
 
     # Show the Plotly chart in Streamlit
-    st.plotly_chart(fig)
+    st.plotly_chart(figure_cache.get('district_population', district_version, STATE, build_district))
 
 else:
     st.error("Unable to load data. Please check the file path or data format.")
 
+# --- Egg Prices Against Income ---
+st.header("🥚 Egg Prices Against Household Income in Kelantan")
+
+# Load the price panel: monthly egg prices per district joined with the latest population and
+# income figures (materialized on disk and only updated for the sources that changed)
+@st.cache_data
+def load_panel(state, versions):
+    perf.count('load_panel.miss')
+    panel = price_panel.update()
+    return panel[panel['state'] == state]
+
+panel_versions = tuple(price_panel.source_versions().items())
+with perf.span('load', 'load_panel'):
+    panel = load_panel(STATE, panel_versions)
+
+if panel['income_median'].notna().any():
+    def build_affordability():
+        # Trays of 10 eggs a median household income buys, per grade and month (averaged over districts)
+        affordability = panel.assign(trays=panel['income_median'] / panel['price_mean'])
+        affordability = affordability.groupby(['month', 'item_code'], as_index=False)['trays'].mean()
+        affordability['item_code'] = affordability['item_code'].replace({118: 'A', 119: 'B', 120: 'C'})
+        return px.line(affordability, x='month', y='trays', color='item_code', markers=True,
+                       title='Egg Trays per Median Monthly Household Income',
+                       labels={'month': 'Month', 'trays': 'Trays of 10 eggs', 'item_code': 'Egg Grade'})
+
+    st.plotly_chart(figure_cache.get('affordability', panel_versions, STATE, build_affordability))
+
+    # The joined panel itself, with the date of the population and income figure each row was matched to
+    st.dataframe(panel, hide_index=True)
+else:
+    st.warning("No income figures are available for the months with egg prices.")
+
+# Timing panel (only shown when PERF_TRACE is set)
+perf.panel()
@@ -2,70 +2,96 @@ import pandas as pd
 import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import LabelEncoder, StandardScaler
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.linear_model import LinearRegression
-from sklearn.tree import DecisionTreeRegressor
-from sklearn.svm import SVR
-from sklearn.metrics import mean_absolute_error, mean_squared_error
+
+import data_store
+import explain
+import feature_store
+import figure_cache
+import model_cache
+import model_registry
+import perf
+import predictive_models
+import price_panel
+import warmup
 
 # Title of the Streamlit app
 st.title("Telur Kelantan Price Prediction 🥚")
+perf.page('3_PREDICTIVE')
+warmup.start()
 
 # Load the dataset
-df = pd.read_csv("telur kelantan filtered.csv")
+@st.cache_data
+def load_data():
+    perf.count('load_data.miss')
+    return data_store.load()
+
+# Preprocessing (cached so widget changes do not redo it)
+@st.cache_data
+def preprocess(df):
+    perf.count('preprocess.miss')
+    return predictive_models.preprocess(df)
+
+# Price-history features (lagged prices, rolling mean/std, days since last price) read from the feature store
+@st.cache_data
+def load_history_features(df):
+    perf.count('load_history_features.miss')
+    features = feature_store.features_for(df)
+    return feature_store.fill_short_history(features)[feature_store.feature_columns()]
+
+# Features for forecasting each series' next price on `date`, from the same feature store as training
+@st.cache_data
+def load_next_features(date, version):
+    perf.count('load_next_features.miss')
+    return feature_store.fill_short_history(feature_store.next_features(date))
+
+# Population and income figures of each row's district and month, read from the price panel
+@st.cache_data
+def load_panel_features(df, versions):
+    perf.count('load_panel_features.miss')
+    return price_panel.features_for(df)
+
+with perf.span('load', 'load_data'):
+    raw_df = load_data()
+df = raw_df
+dates = pd.to_datetime(df['date'])
 
 # Display the first few rows of the dataset
 st.subheader("Dataset Preview")
 st.write(df.head())
 
-# Preprocessing
-# Convert date to datetime and extract useful features
-df['date'] = pd.to_datetime(df['date'])
-df['month'] = df['date'].dt.month
-df['day'] = df['date'].dt.day
-df['day_of_week'] = df['date'].dt.dayofweek
-
-# Encode categorical variables
-label_encoders = {}
-for col in ['premise', 'premise_type', 'state', 'district', 'item', 'unit', 'item_group', 'item_category']:
-    le = LabelEncoder()
-    df[col] = le.fit_transform(df[col])
-    label_encoders[col] = le
-
-# Drop unnecessary columns
-df.drop(['date', 'address'], axis=1, inplace=True)
+with perf.span('transform', 'preprocess'):
+    df = preprocess(df)
 
 # Split data into features and target
-X = df[['item_code', 'month', 'premise_type', 'district']] 
+X = df[predictive_models.FEATURES]
 y = df['price']
 
-# Standardize features
-scaler = StandardScaler()
-X_scaled = scaler.fit_transform(X)
-
-# Split data into training and testing sets
-X_train, X_test, y_train, y_test = train_test_split(X_scaled, y, test_size=0.2, random_state=42)
-
-# Initialize models
-models = {
-    'Random Forest': RandomForestRegressor(random_state=42),
-    'Linear Regression': LinearRegression(),
-    'Decision Tree': DecisionTreeRegressor(random_state=42),
-    'SVM': SVR()
-}
-
-# Train and evaluate models
-results = []
-for name, model in models.items():
-    model.fit(X_train, y_train)
-    y_pred = model.predict(X_test)
-    results.append({
-        'Model': name,
-        'MAE': mean_absolute_error(y_test, y_pred),
-        'MSE': mean_squared_error(y_test, y_pred)
-    })
+# Optionally add each premise's price history to the features
+use_history = st.checkbox("Include price-history features (lagged and rolling prices)")
+if use_history:
+    with perf.span('transform', 'history_features'):
+        history = load_history_features(raw_df).set_index(X.index)
+    X = pd.concat([X, history], axis=1)
+
+    # The first price of each series has no history to learn from, so it is left out
+    has_history = X['price_lag_1'].notna()
+    X, y, dates = X[has_history], y[has_history], dates[has_history]
+    st.caption(f"Training on {len(X)} rows with price history ({(~has_history).sum()} first observations left out)")
+
+# Optionally add the district's population and the state's household income to the features
+if st.checkbox("Include population and income features"):
+    with perf.span('transform', 'panel_features'):
+        panel_features = load_panel_features(raw_df, tuple(price_panel.source_versions().items()))
+    # Sources that are missing (or have no figure old enough for a row) are left out
+    panel_features = panel_features.set_index(df.index).loc[X.index].dropna(axis=1)
+    X = pd.concat([X, panel_features], axis=1)
+    st.caption(f"Added features: {', '.join(panel_features.columns) or 'none available'}")
+
+# Reuse fitted models and metrics when the data and model spec are unchanged
+cache_key = model_cache.make_key(X, y, model_specs=predictive_models.MODEL_SPECS, test_size=0.2, random_state=42)
+with perf.span('train', 'train_and_evaluate'):
+    models, results = model_cache.load_or_compute(
+        cache_key, lambda: predictive_models.train_and_evaluate(predictive_models.build_models(), X, y))
 
 # Convert results to a DataFrame
 results_df = pd.DataFrame(results)
@@ -77,68 +103,214 @@ st.write(results_df)
 # Visualization: MAE and MSE using Plotly
 st.subheader("Model Evaluation by Graph")
 
-# Combined MAE and MSE Visualization
-fig = go.Figure()
-
-# Add MAE trace
-fig.add_trace(go.Bar(
-    x=results_df['Model'],
-    y=results_df['MAE'],
-    name='MAE',
-    marker_color='blue'
-))
-
-# Add MSE trace
-fig.add_trace(go.Bar(
-    x=results_df['Model'],
-    y=results_df['MSE'],
-    name='MSE',
-    marker_color='orange'
-))
-
-# Update layout for the combined graph
-fig.update_layout(
-    title="Model Evaluation: MAE and MSE",
-    xaxis_title="Model",
-    yaxis_title="Error Value",
-    barmode='group',
-    legend_title="Metrics",
-    template="plotly_white"
+# Figures are cached per trained-model version, so reruns do not rebuild them
+def build_evaluation():
+    # Combined MAE and MSE Visualization
+    fig = go.Figure()
+
+    # Add MAE trace
+    fig.add_trace(go.Bar(
+        x=results_df['Model'],
+        y=results_df['MAE'],
+        name='MAE',
+        marker_color='blue'
+    ))
+
+    # Add MSE trace
+    fig.add_trace(go.Bar(
+        x=results_df['Model'],
+        y=results_df['MSE'],
+        name='MSE',
+        marker_color='orange'
+    ))
+
+    # Update layout for the combined graph
+    fig.update_layout(
+        title="Model Evaluation: MAE and MSE",
+        xaxis_title="Model",
+        yaxis_title="Error Value",
+        barmode='group',
+        legend_title="Metrics",
+        template="plotly_white"
+    )
+    return fig
+
+st.plotly_chart(figure_cache.get('evaluation', cache_key, None, build_evaluation), use_container_width=True)
+
+# Forecast the next price of every series with a model trained on price history. The inference rows
+# come from the feature store, like the training rows.
+if use_history:
+    st.subheader("Next-Price Forecast")
+    if list(X.columns) != predictive_models.FEATURES + feature_store.feature_columns():
+        st.caption("Forecasts use the price-history features only; untick the population and income features.")
+    else:
+        forecast_date = st.date_input("Forecast date:", value=(raw_df['date'].max() + pd.Timedelta(days=1)).date())
+        forecast_model = st.selectbox("Model:", list(models))
+        with perf.span('transform', 'next_features'):
+            upcoming = load_next_features(pd.Timestamp(forecast_date), data_store.data_version())
+
+        # Each series' label-encoded premise type and district, as the models were trained on them
+        series = pd.concat([raw_df[feature_store.SERIES_KEY + ['premise']],
+                            df[['premise_type', 'district']]], axis=1)
+        series = series.drop_duplicates(feature_store.SERIES_KEY, keep='last')
+        upcoming = upcoming.merge(series, on=feature_store.SERIES_KEY)
+        upcoming['month'] = upcoming['date'].dt.month
+
+        if upcoming.empty:
+            st.caption("No price history before this date.")
+        else:
+            from sklearn.preprocessing import StandardScaler
+
+            # The models were fitted on standardized inputs (see predictive_models.train_and_evaluate)
+            scaler = StandardScaler().fit(X)
+            upcoming['predicted_price'] = models[forecast_model].predict(scaler.transform(upcoming[X.columns]))
+            st.write(upcoming[['premise', 'item_code', 'price_lag_1', 'predicted_price']]
+                     .rename(columns={'price_lag_1': 'last_price'}))
+
+# Cross-validated evaluation (model x fold grid runs on all cores)
+st.subheader("Cross-Validated Evaluation")
+cv_scheme = st.selectbox(
+    "Split scheme:",
+    ['kfold', 'walk_forward'],
+    format_func=lambda s: {'kfold': 'K-Fold (shuffled)', 'walk_forward': 'Walk-Forward (by date)'}[s]
 )
+cv_folds = st.slider("Number of folds", min_value=2, max_value=10, value=5)
 
-st.plotly_chart(fig, use_container_width=True)
+if st.button("Run cross-validation"):
+    # Imported on demand: it pulls in scipy, which most visits never need
+    import model_eval
 
-# Feature Importance Visualization
+    try:
+        cv_key = model_cache.make_key(X, y, dates, model_specs=predictive_models.MODEL_SPECS, scheme=cv_scheme,
+                                      n_splits=cv_folds, kind='cv')
+        with perf.span('train', 'cross_validation'):
+            cv_summary, cv_folds_df, cv_timing = model_cache.load_or_compute(
+                cv_key,
+                lambda: model_eval.evaluate(predictive_models.build_models(), X, y, dates=dates, scheme=cv_scheme,
+                                            n_splits=cv_folds)
+            )
+
+        st.write(cv_summary)
+        st.caption(
+            f"{cv_timing['n_fits']} fits on {cv_timing['n_workers']} workers: "
+            f"{cv_timing['wall_seconds']:.2f}s wall-clock, {cv_timing['total_fit_seconds']:.2f}s total fit time "
+            f"({cv_timing['speedup']:.1f}x speedup)"
+        )
+
+        def build_cv():
+            # MAE with 95% confidence intervals
+            fig_cv = go.Figure(go.Bar(
+                x=cv_summary['Model'],
+                y=cv_summary['MAE'],
+                error_y=dict(
+                    type='data',
+                    symmetric=False,
+                    array=cv_summary['MAE CI High'] - cv_summary['MAE'],
+                    arrayminus=cv_summary['MAE'] - cv_summary['MAE CI Low']
+                ),
+                marker_color='blue'
+            ))
+            fig_cv.update_layout(
+                title="Cross-Validated MAE (95% CI)",
+                xaxis_title="Model",
+                yaxis_title="MAE",
+                template="plotly_white"
+            )
+            return fig_cv
+
+        st.plotly_chart(figure_cache.get('cv', cv_key, None, build_cv), use_container_width=True)
+
+        with st.expander("Per-fold results"):
+            st.write(cv_folds_df)
+    except Exception as e:
+        st.error(f"An error occurred during cross-validation: {e}")
+
+# Feature Importance Visualization (permutation importance and partial dependence work for every model;
+# they are computed once on a process pool and cached by model hash and data version)
 if st.checkbox("Show feature importance for models"):
-    # Dropdown for model selection
+    # Dropdown for model selection: the models trained above and the pickled PREDICT APP pipelines
+    pipeline_labels = {f"{name} pipeline (PREDICT APP)": name for name in model_registry.MODEL_FILES}
     selected_model = st.selectbox(
         "Select a model to display feature importance:",
-        ['Random Forest', 'Decision Tree']
+        list(models) + list(pipeline_labels)
     )
 
-    # Check if the selected model supports feature importance
-    if selected_model in ['Random Forest', 'Decision Tree']:
-        model = models[selected_model]  # Fetch the trained model
-        feature_importances = model.feature_importances_  # Get feature importance
-        feature_names = ['item_code', 'month', 'premise_type', 'district']
-
-        # Plotly bar chart for feature importance
-        fig_features = px.bar(
-            x=feature_importances,
-            y=feature_names,
-            orientation='h',
-            title=f'Feature Importance ({selected_model})',
-            labels={'x': 'Importance', 'y': 'Feature'}
-        )
+    if selected_model in pipeline_labels:
+        explanation_key = explain.pipeline_explanation_key(pipeline_labels[selected_model])
 
-        # Update layout for better aesthetics
-        fig_features.update_layout(
-            xaxis_title="Importance",
-            yaxis_title="Feature",
-            template="plotly_white"
-        )
+        # explain_pipeline caches its result under explanation_key itself
+        def compute_explanation():
+            return explain.explain_pipeline(pipeline_labels[selected_model])
+    else:
+        # cache_key identifies the fitted models (training data + model spec)
+        explanation_key = explain.explanation_key(cache_key, data_store.data_version(), model=selected_model,
+                                                  max_rows=explain.MAX_ROWS, n_repeats=explain.N_REPEATS)
+
+        def compute_explanation():
+            from sklearn.preprocessing import StandardScaler
+
+            # The models were fitted on standardized inputs (see predictive_models.train_and_evaluate)
+            return model_cache.load_or_compute(
+                explanation_key,
+                lambda: explain.explain(models[selected_model], X, y, scaler=StandardScaler().fit(X)),
+                namespace=explain.CACHE_NAMESPACE)
+
+    explanation = model_cache.get(explanation_key, namespace=explain.CACHE_NAMESPACE)
+    if explanation is None:
+        st.info("Explanations for this model have not been computed yet. "
+                "Once computed they are cached (pipelines can be precomputed with `python explain.py`).")
+        if st.button("Compute explanations"):
+            with st.spinner("Computing permutation importance and partial dependence..."):
+                with perf.span('train', f"explain {selected_model}"):
+                    explanation = compute_explanation()
+
+    if explanation is not None:
+        st.caption(f"Computed on {explanation['rows']} sampled rows in {explanation['seconds']:.1f}s")
+
+        def build_features():
+            importance = explanation['importance'].sort_values('importance_mean')
+
+            # Plotly bar chart for feature importance
+            fig_features = px.bar(
+                importance,
+                x='importance_mean',
+                y='feature',
+                error_x='importance_std',
+                orientation='h',
+                title=f'Permutation Importance ({selected_model})',
+                labels={'importance_mean': 'Increase in MAE when shuffled', 'feature': 'Feature'}
+            )
+
+            # Update layout for better aesthetics
+            fig_features.update_layout(
+                xaxis_title="Increase in MAE when shuffled",
+                yaxis_title="Feature",
+                template="plotly_white"
+            )
+            return fig_features
 
         # Display the chart
-        st.plotly_chart(fig_features, use_container_width=True)
-    else:
-        st.write(f"{selected_model} does not support feature importance.")
+        st.plotly_chart(figure_cache.get('features', explanation_key, None, build_features), use_container_width=True)
+
+        # Partial dependence: average prediction as one feature varies
+        dependence_feature = st.selectbox("Partial dependence of:", list(explanation['importance']['feature']))
+
+        def build_dependence():
+            curves = explanation['partial_dependence']
+            curve = curves[curves['feature'] == dependence_feature]
+            fig_dependence = px.line(
+                curve,
+                x='value',
+                y='prediction',
+                markers=True,
+                title=f'Partial Dependence on {dependence_feature} ({selected_model})',
+                labels={'value': dependence_feature, 'prediction': 'Average Predicted Price'}
+            )
+            fig_dependence.update_layout(template="plotly_white")
+            return fig_dependence
+
+        st.plotly_chart(figure_cache.get('dependence', explanation_key, dependence_feature, build_dependence),
+                        use_container_width=True)
+
+# Timing panel (only shown when PERF_TRACE is set)
+perf.panel()
@@ -0,0 +1,77 @@
+import streamlit as st
+import plotly.graph_objects as go
+
+import anomaly_detector
+import data_store
+import figure_cache
+import perf
+import warmup
+
+# Title of the Streamlit app
+st.title("Unusual Egg Prices in Kelantan 🚨")
+perf.page('4_ANOMALIES')
+warmup.start()
+
+st.markdown("""
+    Each premise's price for each egg grade is tracked with a running mean and an exponentially
+    weighted moving average (EWMA). Prices far from the recent EWMA, measured in standard deviations,
+    are flagged below, most unusual first.
+""")
+
+# Flagged prices of the detector with this half-life. The default detector is only read here (ingest
+# and the warm-up keep it current); another half-life is scored into its own checkpoint, which only
+# processes rows it has not seen yet after its first run.
+@st.cache_data
+def load_anomalies(version, state_version, half_life):
+    perf.count('load_anomalies.miss')
+    if half_life != anomaly_detector.HALF_LIFE:
+        anomaly_detector.catch_up(half_life=half_life)
+    return anomaly_detector.ranked(threshold=0, half_life=half_life)
+
+# Sidebar settings
+st.sidebar.header("Detector Settings")
+half_life = st.sidebar.select_slider("EWMA half-life (observations)", options=[3, 5, 7, 14, 30],
+                                     value=anomaly_detector.HALF_LIFE)
+threshold = st.sidebar.slider("Flag prices at least this many standard deviations away", min_value=3.0,
+                              max_value=10.0, value=anomaly_detector.THRESHOLD, step=0.5)
+limit = st.sidebar.number_input("Rows to show", min_value=10, max_value=1000, value=50, step=10)
+
+version = data_store.data_version()
+with perf.span('load', 'load_anomalies'):
+    anomalies = load_anomalies(version, anomaly_detector.state_version(half_life), half_life)
+anomalies = anomalies[anomalies['z_ewma'].abs() >= threshold]
+
+st.subheader("Ranked Anomalies")
+if anomaly_detector.state_version(half_life) is None:
+    st.info("The detector has not scored any prices yet (it runs on ingest and during the warm-up).")
+elif anomalies.empty:
+    st.success("No unusual prices at this threshold.")
+else:
+    st.caption(f"{len(anomalies)} flagged prices across "
+               f"{anomalies.groupby(anomaly_detector.SERIES_KEY).ngroups} premise/grade series")
+    st.dataframe(anomalies.head(int(limit)), hide_index=True)
+
+    # Price history of one flagged series with its anomalies marked
+    st.subheader("Series Detail")
+    series = anomalies.drop_duplicates(anomaly_detector.SERIES_KEY)
+    labels = {
+        (row.premise_code, row.item_code): f"{getattr(row, 'premise', row.premise_code)} - grade {row.item_code}"
+        for row in series.itertuples()
+    }
+    selected = st.selectbox("Series", list(labels), format_func=labels.get)
+
+    def build_series():
+        df = data_store.load(columns=['date', 'premise_code', 'item_code', 'price'])
+        history = df[(df['premise_code'] == selected[0]) & (df['item_code'] == selected[1])].sort_values('date')
+        flagged = anomalies[(anomalies['premise_code'] == selected[0]) & (anomalies['item_code'] == selected[1])]
+        fig = go.Figure()
+        fig.add_trace(go.Scatter(x=history['date'], y=history['price'], mode='lines+markers', name='Price'))
+        fig.add_trace(go.Scatter(x=flagged['date'], y=flagged['price'], mode='markers', name='Flagged',
+                                 marker=dict(color='red', size=12, symbol='x')))
+        fig.update_layout(xaxis_title='Date', yaxis_title='Price (RM)', template='plotly_white')
+        return fig
+
+    st.plotly_chart(figure_cache.get('anomaly_series', version, [half_life, threshold, list(selected)], build_series))
+
+# Timing panel (only shown when PERF_TRACE is set)
+perf.panel()
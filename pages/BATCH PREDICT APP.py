@@ -0,0 +1,67 @@
+import os
+import tempfile
+
+import streamlit as st
+
+import batch_predict
+import model_registry
+import perf
+import warmup
+
+# Streamlit app
+st.title("Batch Price Prediction App")
+perf.page('BATCH PREDICT APP')
+warmup.start()
+
+# Info about the expected file layout
+st.info("Upload a CSV or Parquet scenario sheet with the columns "
+        "`item_code`, `premise_type`, `district` and `month` (1-12).\n"
+        "Every row is scored by all four models side by side.")
+
+# Show the accepted values for each categorical column
+with st.expander("Accepted values"):
+    for col, categories in model_registry.get_category_map('RF').items():
+        st.write(f"**{col}**: {', '.join(str(c) for c in categories)}")
+
+# Models to score with
+model_names = st.multiselect(
+    "Models",
+    list(model_registry.MODEL_FILES),
+    default=list(model_registry.MODEL_FILES)
+)
+
+uploaded_file = st.file_uploader("Upload scenario file", type=['csv', 'parquet'])
+
+if uploaded_file is not None and model_names and st.button("Score file"):
+    progress_bar = st.progress(0.0, text="Scoring...")
+    output_path = os.path.join(tempfile.gettempdir(), f"batch_predictions_{os.getpid()}_{id(uploaded_file)}.csv")
+    try:
+        # Results are streamed to a file on disk chunk by chunk
+        with perf.span('predict', 'score_file'):
+            rows, invalid_rows = batch_predict.score_file(
+                uploaded_file,
+                uploaded_file.name,
+                output_path,
+                model_names=model_names,
+                progress=lambda fraction: progress_bar.progress(fraction, text=f"Scoring... {fraction:.0%}")
+            )
+        progress_bar.progress(1.0, text="Done")
+        st.success(f"Scored {rows:,} rows with {len(model_names)} models")
+        if invalid_rows:
+            st.warning(f"{invalid_rows:,} rows could not be scored; see the `error` column")
+
+        with open(output_path, 'rb') as f:
+            st.download_button(
+                "Download predictions",
+                f,
+                file_name=f"{os.path.splitext(uploaded_file.name)[0]}_predictions.csv",
+                mime='text/csv'
+            )
+    except Exception as e:
+        st.error(f"An error occurred during batch prediction: {e}")
+    finally:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+
+# Timing panel (only shown when PERF_TRACE is set)
+perf.panel()
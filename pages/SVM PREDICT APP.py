@@ -1,23 +1,32 @@
 import streamlit as st
-import pandas as pd
-import joblib
 
-# Load the trained pipeline
-pipeline = joblib.load('svm_model_pipeline.pkl')
+import inference_client
+import model_registry
+import perf
+import segment_training
+import warmup
+
+perf.page('SVM PREDICT APP')
+warmup.start()
+
+# Model scope: the shipped Kelantan egg model, or one trained per state and item category
+segments = segment_training.segments('SVM')
+segment = st.sidebar.selectbox(
+    "Model scope", [None] + list(segments),
+    format_func=lambda segment: "Kelantan eggs (shipped model)" if segment is None else
+    f"{segments[segment]['state']} / {segments[segment]['item_category']} (v{segments[segment]['current']})"
+)
 
 # Extract available options for categorical features
-preprocessor = pipeline.named_steps['preprocessor']
-one_hot_encoder = preprocessor.named_transformers_['cat']
-categories = one_hot_encoder.categories_
+categories = model_registry.get_categories('SVM', segment)
 
 # Streamlit app
 st.title("Price Prediction App")
 
-# Info about item codes
-st.info("Item Codes represent different grades of eggs:\n"
-        "- 118: TELUR AYAM GRED A\n"
-        "- 119: TELUR AYAM GRED B\n"
-        "- 120: TELUR AYAM GRED C")
+# Info about item codes: the items of the selected model's data
+item_names = segment_training.item_names(segment)
+st.info("Item Codes represent these items:\n" +
+        "\n".join(f"- {code}: {item_names.get(code, 'unknown item')}" for code in categories[0]))
 
 # Input fields for categorical features
 item_code = st.selectbox("Select Item Code", categories[0])  # Options for item_code
@@ -27,19 +36,15 @@ district = st.selectbox("Select District", categories[2])  # Options for distric
 # Input field for numerical feature
 month = st.number_input("Enter Month (1-12)", min_value=1, max_value=12, value=1)
 
-# Create raw input DataFrame
-input_data = pd.DataFrame({
-    'item_code': [item_code],
-    'premise_type': [premise_type],
-    'district': [district],
-    'month': [month]
-})
-
 # Predict button
 if st.button("Predict"):
     try:
-        # Pass raw input to the pipeline
-        prediction = pipeline.predict(input_data)[0]
+        # Served by the shared inference server (falls back to the local precompiled grid if it is not running)
+        with perf.span('predict', 'SVM'):
+            prediction = inference_client.predict('SVM', item_code, premise_type, district, month, segment=segment)
         st.success(f"Predicted Price: RM{prediction:.2f}")
     except Exception as e:
         st.error(f"An error occurred during prediction: {e}")
+
+# Timing panel (only shown when PERF_TRACE is set)
+perf.panel()
@@ -0,0 +1,157 @@
+import contextlib
+import json
+import os
+import threading
+import time
+import tracemalloc
+import uuid
+
+# Tracing is off unless PERF_TRACE=1; spans are then a shared no-op context
+ENABLED = os.environ.get('PERF_TRACE', '').lower() in ('1', 'true', 'yes')
+
+# Peak-memory tracking (tracemalloc) slows allocations down, so it can be left out with PERF_MEMORY=0
+TRACK_MEMORY = os.environ.get('PERF_MEMORY', '1').lower() not in ('0', 'false', 'no')
+
+# JSON-lines file the spans of every run are appended to (none if empty)
+LOG_PATH = os.environ.get('PERF_LOG', '')
+
+STAGES = ['load', 'transform', 'train', 'predict', 'render']
+
+# Process-wide event counters (cache misses etc.), shown next to figure_cache/model_cache stats
+counters = {}
+_lock = threading.Lock()
+
+# Spans of the current script run; each Streamlit session reruns its page in its own thread
+_local = threading.local()
+_noop = contextlib.nullcontext()
+
+
+# Turn tracing on for this process (e.g. from a debugging session)
+def enable(track_memory=TRACK_MEMORY):
+    global ENABLED, TRACK_MEMORY
+    ENABLED, TRACK_MEMORY = True, track_memory
+    if TRACK_MEMORY and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+if ENABLED:
+    enable()
+
+
+# Start a new run for `page`: clears the spans shown in the panel
+def page(name):
+    if not ENABLED:
+        return
+    _local.run = {'id': uuid.uuid4().hex[:12], 'page': name, 'started': time.time()}
+    _local.records = []
+    _local.stack = []
+
+
+@contextlib.contextmanager
+def _span(stage, name):
+    if not hasattr(_local, 'records'):
+        _local.run = {'id': uuid.uuid4().hex[:12], 'page': None, 'started': time.time()}
+        _local.records, _local.stack = [], []
+    stack = _local.stack
+
+    memory = TRACK_MEMORY and tracemalloc.is_tracing()
+    if memory:
+        current, peak = tracemalloc.get_traced_memory()
+        # The peak is reset for this span, so fold the parent's peak so far into the parent first
+        if stack:
+            stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+        tracemalloc.reset_peak()
+    entry = {'peak': 0, 'base': current if memory else 0}
+    stack.append(entry)
+    started = time.time()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        stack.pop()
+        peak_bytes = None
+        if memory:
+            peak = max(tracemalloc.get_traced_memory()[1], entry['peak'])
+            if stack:
+                stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+            peak_bytes = peak - entry['base']
+        _local.records.append({
+            'stage': stage,
+            'name': name,
+            'seconds': seconds,
+            'peak_bytes': peak_bytes,
+            'depth': len(stack),
+            'start': started,
+        })
+
+
+# Time (and measure peak memory of) a block: `with perf.span('load', 'load_data'): ...`
+def span(stage, name):
+    if not ENABLED:
+        return _noop
+    return _span(stage, name)
+
+
+# Count an event, e.g. perf.count('load_data.miss') inside a cached function body
+def count(name, n=1):
+    if not ENABLED:
+        return
+    with _lock:
+        counters[name] = counters.get(name, 0) + n
+
+
+# Spans recorded so far in this thread's current run, in start order (parents before children)
+def records():
+    return sorted(getattr(_local, 'records', []), key=lambda record: record['start'])
+
+
+# Append this run's spans to LOG_PATH as JSON lines
+def export(path=None):
+    path = path or LOG_PATH
+    if not path or not getattr(_local, 'records', None):
+        return
+    run = _local.run
+    lines = [json.dumps({'run': run['id'], 'page': run['page'], **record}) for record in records()]
+    with _lock, open(path, 'a') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+# Cache hit/miss counters of every cache the pages use
+def cache_stats():
+    import figure_cache
+    import model_cache
+
+    stats = {f'figure_cache.{key}': value for key, value in figure_cache.stats.items()}
+    stats.update({f'model_cache.{key}': value for key, value in model_cache.stats.items()})
+    stats.update(counters)
+    return stats
+
+
+# Sidebar panel with this run's spans and the cache counters; also exports the run.
+# Call at the end of a page; does nothing when tracing is off.
+def panel():
+    if not ENABLED:
+        return
+    import pandas as pd
+    import streamlit as st
+
+    export()
+    spans = pd.DataFrame(records(), columns=['stage', 'name', 'seconds', 'peak_bytes', 'depth'])
+    with st.sidebar.expander("⏱️ Performance", expanded=False):
+        if spans.empty:
+            st.write("No spans recorded in this run.")
+        else:
+            # Only top-level spans add up to the run's time
+            top = spans[spans['depth'] == 0]
+            st.caption(f"{top['seconds'].sum() * 1000:.1f} ms in {len(spans)} spans")
+            st.dataframe(
+                top.groupby('stage')['seconds'].sum().reindex(STAGES).dropna().mul(1000).rename('ms')
+            )
+            table = spans.assign(
+                name=spans['depth'].map(lambda depth: '· ' * depth) + spans['name'],
+                ms=spans['seconds'] * 1000,
+                peak_mb=spans['peak_bytes'] / 2**20,
+            )[['stage', 'name', 'ms', 'peak_mb']]
+            st.dataframe(table, hide_index=True)
+        st.write(cache_stats())
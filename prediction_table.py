@@ -0,0 +1,133 @@
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+import compiled_model
+import data_store
+import model_registry
+
+# Folder holding the precompiled prediction grids
+TABLE_DIR = ".prediction_tables"
+
+MONTHS = np.arange(1, 13)
+
+# (path, mtime) -> sha256 of the pickle, so the file is only hashed when it changes
+_hashes = {}
+
+# Loaded tables: name -> (version, values, lookup dicts)
+_tables = {}
+
+
+# Version stamp of a pipeline: hash of its pickle file
+def pipeline_version(name):
+    path = model_registry.MODEL_FILES[name]
+    key = (path, os.path.getmtime(path))
+    if key not in _hashes:
+        with open(path, 'rb') as f:
+            _hashes[key] = hashlib.sha256(f.read()).hexdigest()
+    return _hashes[key]
+
+
+def table_path(name):
+    return os.path.join(TABLE_DIR, f"{name.lower()}_table.npz")
+
+
+# Evaluate the pipeline over every (item_code, premise_type, district, month) in one predict call
+def compile_table(name):
+    pipeline = model_registry.get_pipeline(name)
+    item_codes, premise_types, districts = model_registry.get_categories(name)
+
+    # Cartesian product of category positions, in C order so reshape matches the grid
+    grid = np.indices((len(item_codes), len(premise_types), len(districts), len(MONTHS))).reshape(4, -1)
+    input_data = pd.DataFrame({
+        'item_code': np.asarray(item_codes)[grid[0]],
+        'premise_type': np.asarray(premise_types)[grid[1]],
+        'district': np.asarray(districts)[grid[2]],
+        'month': MONTHS[grid[3]]
+    })
+
+    values = pipeline.predict(input_data).astype(np.float32)
+    values = values.reshape(len(item_codes), len(premise_types), len(districts), len(MONTHS))
+
+    os.makedirs(TABLE_DIR, exist_ok=True)
+    path = table_path(name)
+    tmp_path = data_store.temp_path(path, '.tmp.npz')
+    np.savez(tmp_path, values=values, version=np.array(pipeline_version(name)))
+    os.replace(tmp_path, path)
+    _tables.pop(name, None)
+    return values
+
+
+# Return (values, lookups) for a fresh table, or None if it is missing or stale
+def load_table(name):
+    version = pipeline_version(name)
+    entry = _tables.get(name)
+    if entry is not None and entry[0] == version:
+        return entry[1], entry[2]
+
+    path = table_path(name)
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        if str(data['version']) != version:
+            return None
+        values = data['values']
+
+    # Map each category value to its position along the grid axis
+    lookups = [
+        {value: i for i, value in enumerate(categories)}
+        for categories in model_registry.get_categories(name)
+    ]
+    _tables[name] = (version, values, lookups)
+    return values, lookups
+
+
+# Predicted price for one input: O(1) table lookup, the compiled (NumPy-only) model as a fallback
+def predict(name, item_code, premise_type, district, month):
+    table = load_table(name)
+    if table is not None:
+        values, (item_lookup, premise_lookup, district_lookup) = table
+        try:
+            return float(values[item_lookup[item_code], premise_lookup[premise_type],
+                                district_lookup[district], int(month) - 1])
+        except (KeyError, IndexError):
+            # Input outside the compiled grid
+            pass
+
+    return compiled_model.predict_one(compiled_model.load(name), item_code=item_code, premise_type=premise_type,
+                                      district=district, month=month)
+
+
+# Vectorized version of predict() for a DataFrame with the four input columns
+def predict_frame(name, frame):
+    frame = frame[['item_code', 'premise_type', 'district', 'month']]
+    predictions = np.full(len(frame), np.nan)
+    missing = np.ones(len(frame), dtype=bool)
+
+    table = load_table(name)
+    if table is not None:
+        values, lookups = table
+        codes = [
+            pd.Categorical(frame[col], categories=list(lookup)).codes
+            for col, lookup in zip(['item_code', 'premise_type', 'district'], lookups)
+        ]
+        month = pd.to_numeric(frame['month'], errors='coerce').to_numpy()
+        month_codes = np.where(np.isin(month, MONTHS), month - 1, -1).astype(int)
+
+        found = (codes[0] >= 0) & (codes[1] >= 0) & (codes[2] >= 0) & (month_codes >= 0)
+        predictions[found] = values[codes[0][found], codes[1][found], codes[2][found], month_codes[found]]
+        missing = ~found
+
+    # Rows outside the compiled grid (or no table at all) go through the compiled model
+    if missing.any():
+        predictions[missing] = compiled_model.predict(compiled_model.load(name), frame[missing])
+    return predictions
+
+
+# Compile the tables for every shipped pipeline: python prediction_table.py
+if __name__ == "__main__":
+    for model_name in model_registry.MODEL_FILES:
+        table = compile_table(model_name)
+        print(f"{model_name}: compiled {table.size} predictions -> {table_path(model_name)}")
@@ -0,0 +1,73 @@
+import importlib
+
+# Preprocessing and model training of 3_PREDICTIVE.py, importable so benchmark.py times the page's
+# own code path. scikit-learn is only imported inside the functions, when a model has to be fitted.
+
+# Columns label-encoded before training
+ENCODED_COLUMNS = ['premise', 'premise_type', 'state', 'district', 'item', 'unit', 'item_group', 'item_category']
+
+# Base features of every model
+FEATURES = ['item_code', 'month', 'premise_type', 'district']
+
+# Models as (module, class, parameters): the cache keys are built from this spec
+MODEL_SPECS = {
+    'Random Forest': ('sklearn.ensemble', 'RandomForestRegressor', {'random_state': 42}),
+    'Linear Regression': ('sklearn.linear_model', 'LinearRegression', {}),
+    'Decision Tree': ('sklearn.tree', 'DecisionTreeRegressor', {'random_state': 42}),
+    'SVM': ('sklearn.svm', 'SVR', {})
+}
+
+
+# Date parts and label-encoded categories, as the page trains on them
+def preprocess(df):
+    from sklearn.preprocessing import LabelEncoder
+
+    df = df.copy()
+
+    # Extract useful features from the date
+    df['month'] = df['date'].dt.month
+    df['day'] = df['date'].dt.day
+    df['day_of_week'] = df['date'].dt.dayofweek
+
+    # Encode categorical variables
+    for col in ENCODED_COLUMNS:
+        le = LabelEncoder()
+        df[col] = le.fit_transform(df[col])
+
+    # Drop unnecessary columns
+    df.drop(['date', 'address'], axis=1, inplace=True)
+    return df
+
+
+# Initialize models from the spec (all of them, or the named ones)
+def build_models(names=None):
+    return {
+        name: getattr(importlib.import_module(module), class_name)(**params)
+        for name, (module, class_name, params) in MODEL_SPECS.items()
+        if names is None or name in names
+    }
+
+
+# Standardize, split 80/20, fit every model and score it on the held-out rows
+def train_and_evaluate(models, X, y):
+    from sklearn.metrics import mean_absolute_error, mean_squared_error
+    from sklearn.model_selection import train_test_split
+    from sklearn.preprocessing import StandardScaler
+
+    # Standardize features
+    scaler = StandardScaler()
+    X_scaled = scaler.fit_transform(X)
+
+    # Split data into training and testing sets
+    X_train, X_test, y_train, y_test = train_test_split(X_scaled, y, test_size=0.2, random_state=42)
+
+    results = []
+    for name, model in models.items():
+        model.fit(X_train, y_train)
+        y_pred = model.predict(X_test)
+        results.append({
+            'Model': name,
+            'MAE': mean_absolute_error(y_test, y_pred),
+            'MSE': mean_squared_error(y_test, y_pred)
+        })
+    return models, results
@@ -0,0 +1,176 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+import data_store
+
+# Price aggregates are computed per district, egg grade and calendar month
+PANEL_KEY = ['state', 'district', 'item_code', 'month']
+
+# Observations joined onto the panel: name -> (source, join keys, {source column: panel column}, aggregation).
+# Each panel row gets the latest observation dated at or before the start of its month, plus that
+# observation's date in `<name>_date`.
+JOINS = {
+    'income': ('hh_income_state.csv', ['state'], {'income_mean': 'income_mean', 'income_median': 'income_median'}, 'mean'),
+    'state_population': ('population_state.csv', ['state'], {'population': 'state_population'}, 'sum'),
+    'district_population': ('population_district.csv', ['state', 'district'], {'population': 'district_population'}, 'sum'),
+}
+
+# Breakdown columns of the population datasets and the value of their all-groups rows
+TOTALS = {'sex': 'both', 'age': 'overall', 'ethnicity': 'overall'}
+
+# Panel columns offered to the models as extra features
+MODEL_FEATURES = ['income_mean', 'income_median', 'state_population', 'district_population']
+
+PANEL_PATH = os.path.join(data_store.STORE_DIR, "panel", "price_panel.pkl")
+
+
+# Version of every input (None for sources that are missing)
+def source_versions(source=data_store.SOURCE):
+    versions = {'prices': data_store.data_version(source)}
+    versions.update({name: data_store.data_version(spec[0]) for name, spec in JOINS.items()})
+    return versions
+
+
+# Rows and price sum per month: months whose stats differ from the stored panel are re-aggregated
+def month_stats(df):
+    month = df['date'].dt.to_period('M').dt.to_timestamp()
+    stats = df['price'].astype(float).groupby(month).agg(['count', 'sum'])
+    return {month.strftime('%Y-%m'): [int(row['count']), round(float(row['sum']), 4)] for month, row in stats.iterrows()}
+
+
+# Price aggregates per district, grade and month for the given price rows
+def aggregate(df):
+    rows = df[['state', 'district', 'item_code', 'premise_code', 'price']].copy()
+    for col in ['state', 'district']:
+        rows[col] = rows[col].astype(str)
+    rows['month'] = df['date'].dt.to_period('M').dt.to_timestamp()
+    rows['price'] = rows['price'].astype(float)
+    grouped = rows.groupby(PANEL_KEY, sort=False)
+    panel = grouped['price'].agg(['mean', 'median', 'min', 'max', 'count'])
+    panel.columns = ['price_mean', 'price_median', 'price_min', 'price_max', 'observations']
+    panel['premises'] = grouped['premise_code'].nunique()
+    return panel.reset_index()
+
+
+# One observation per join key and date, or None if the source is missing.
+# Population datasets are broken down by sex, age and ethnicity; only their all-groups rows are kept.
+def load_observations(name):
+    source, by, columns, agg = JOINS[name]
+    if not os.path.exists(source):
+        return None
+    obs = pd.read_csv(source)
+    obs['date'] = pd.to_datetime(obs['date'], errors='coerce')
+    obs = obs.dropna(subset=['date'])
+    for col, total in TOTALS.items():
+        if col in obs.columns and (obs[col] == total).any():
+            obs = obs[obs[col] == total]
+    for col in by:
+        obs[col] = obs[col].astype(str)
+    obs = getattr(obs.groupby(by + ['date'])[list(columns)], agg)().reset_index()
+    return obs.rename(columns={**columns, 'date': f'{name}_date'})
+
+
+# As-of join: each panel row gets the latest observation of its state/district at or before its month
+def join(panel, name, observations):
+    _, by, columns, _ = JOINS[name]
+    new_columns = list(columns.values()) + [f'{name}_date']
+    panel = panel.drop(columns=[col for col in new_columns if col in panel.columns])
+    if observations is None:
+        return panel.assign(**{col: np.nan for col in columns.values()}, **{f'{name}_date': pd.NaT})
+
+    # merge_asof needs both sides sorted on the as-of key; the panel's row order is restored afterwards
+    date_col = f'{name}_date'
+    ordered = panel.sort_values('month', kind='stable')
+    joined = pd.merge_asof(
+        ordered, observations.sort_values(date_col, kind='stable'),
+        left_on='month', right_on=date_col, by=by, direction='backward'
+    )
+    joined.index = ordered.index
+    return joined.loc[panel.index]
+
+
+# Stored panel (None if it has not been built)
+def load():
+    if not os.path.exists(PANEL_PATH):
+        return None
+    return pd.read_pickle(PANEL_PATH)
+
+
+def _save(panel, versions, stats):
+    panel.attrs['versions'] = versions
+    panel.attrs['month_stats'] = stats
+    os.makedirs(os.path.dirname(PANEL_PATH), exist_ok=True)
+    tmp_path = data_store.temp_path(PANEL_PATH)
+    panel.to_pickle(tmp_path)
+    os.replace(tmp_path, PANEL_PATH)
+
+
+# Aggregate every month and join every source, then write the panel to disk
+def build(df=None, source=data_store.SOURCE):
+    df = data_store.load(source) if df is None else df
+    panel = aggregate(df)
+    for name in JOINS:
+        panel = join(panel, name, load_observations(name))
+    panel = panel.sort_values(PANEL_KEY, kind='stable').reset_index(drop=True)
+    _save(panel, source_versions(source), month_stats(df))
+    return panel
+
+
+# Bring the stored panel up to date. Only months whose price rows changed are re-aggregated,
+# and only sources whose file changed are joined again over the whole panel.
+def update(df=None, source=data_store.SOURCE):
+    versions = source_versions(source)
+    panel = load()
+    if panel is None:
+        return build(df, source)
+    stored = panel.attrs.get('versions', {})
+    if stored == versions:
+        return panel
+
+    stats = panel.attrs.get('month_stats', {})
+    changed_joins = [name for name in JOINS if stored.get(name) != versions[name]]
+    if stored.get('prices') != versions['prices']:
+        df = data_store.load(source) if df is None else df
+        stats = month_stats(df)
+        old_stats = panel.attrs.get('month_stats', {})
+        months = {month for month in set(stats) | set(old_stats) if stats.get(month) != old_stats.get(month)}
+        if months:
+            changed_months = pd.to_datetime(sorted(months))
+            fresh = aggregate(df[df['date'].dt.to_period('M').dt.to_timestamp().isin(changed_months)])
+            for name in JOINS:
+                if name not in changed_joins:
+                    fresh = join(fresh, name, load_observations(name))
+            panel = pd.concat([panel[~panel['month'].isin(changed_months)], fresh], ignore_index=True)
+
+    for name in changed_joins:
+        panel = join(panel, name, load_observations(name))
+    panel = panel.sort_values(PANEL_KEY, kind='stable').reset_index(drop=True)
+    _save(panel, versions, stats)
+    return panel
+
+
+# Panel columns for every price row of `df` (joined on state, district, grade and month)
+def features_for(df, columns=MODEL_FEATURES):
+    panel = update()
+    keys = pd.DataFrame({
+        'state': df['state'].astype(str).to_numpy(),
+        'district': df['district'].astype(str).to_numpy(),
+        'item_code': df['item_code'].to_numpy(),
+        'month': df['date'].dt.to_period('M').dt.to_timestamp().to_numpy(),
+    })
+    return keys.merge(panel[PANEL_KEY + list(columns)], on=PANEL_KEY, how='left')[list(columns)]
+
+
+# Example (after ingest or a population/income refresh): python price_panel.py
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the price panel joined with population and income")
+    parser.add_argument('--source', default=data_store.SOURCE)
+    parser.add_argument('--rebuild', action='store_true', help="rebuild from scratch instead of updating")
+    args = parser.parse_args()
+
+    result = build(source=args.source) if args.rebuild else update(source=args.source)
+    print(f"{len(result)} panel rows; sources: {result.attrs['versions']}")
+    print(result.head(10).to_string(index=False))
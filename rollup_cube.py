@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+
+# Cube dimensions: every chart on the descriptive page groups by a subset of these
+DIMENSIONS = ['district', 'premise', 'premise_type', 'item_code', 'year', 'month']
+
+# Prices are recorded in sen, so a 1-sen histogram is an exact (and mergeable) quantile sketch
+PRICE_STEP = 0.01
+
+
+# Single pass over the raw rows: number of rows per (dimensions, price bin)
+def histogram(df):
+    rows = pd.DataFrame({dim: df[dim] for dim in ['district', 'premise', 'premise_type', 'item_code']})
+    rows['year'] = df['date'].dt.year
+    rows['month'] = df['date'].dt.month
+    rows['price_bin'] = np.rint(df['price'].to_numpy(dtype=float) / PRICE_STEP).astype(np.int64)
+    return rows.groupby(DIMENSIONS + ['price_bin'], observed=True).size().reset_index(name='n')
+
+
+# Cube from one or more concatenated histograms (e.g. one per month partition).
+# Count, sum, sum of squares, min and max for each cell are derived from the histogram.
+def from_hist(hist):
+    hist = hist.groupby(DIMENSIONS + ['price_bin'], observed=True)['n'].sum().reset_index()
+    return {'hist': hist, 'cells': _cell_stats(hist, DIMENSIONS)}
+
+
+def build(df):
+    return from_hist(histogram(df))
+
+
+def _cell_stats(hist, by):
+    price = hist['price_bin'] * PRICE_STEP
+    weighted = hist.assign(price_sum=price * hist['n'], price_sumsq=price ** 2 * hist['n'], price=price)
+    return weighted.groupby(by, observed=True).agg(
+        count=('n', 'sum'),
+        price_sum=('price_sum', 'sum'),
+        price_sumsq=('price_sumsq', 'sum'),
+        price_min=('price', 'min'),
+        price_max=('price', 'max'),
+    ).reset_index()
+
+
+# Keep only the cube cells matching the given values, e.g. select(cube, district=['Bachok'])
+def select(cube, **conditions):
+    hist = cube['hist']
+    mask = np.ones(len(hist), dtype=bool)
+    for dim, values in conditions.items():
+        if values is not None:
+            mask &= hist[dim].isin(values).to_numpy()
+    hist = hist[mask]
+    return {'hist': hist, 'cells': _cell_stats(hist, DIMENSIONS)}
+
+
+# Cube for the dates start..end (None = open-ended) and the given values. Whole months are selected
+# from `cube`; only the partial months at either end are rebuilt, from the rows that
+# edge_rows(first_day, last_day) returns (already filtered on the same values).
+def select_range(cube, start, end, edge_rows, **conditions):
+    hist = cube['hist']
+    months = (hist['year'].to_numpy() - 1970) * 12 + hist['month'].to_numpy() - 1
+    mask = np.ones(len(hist), dtype=bool)
+    edges = []
+    if start is not None:
+        start = pd.Timestamp(start)
+        first = start.to_period('M')
+        if start != first.start_time:
+            edges.append((start, first.end_time.normalize()))
+            first += 1
+        mask &= months >= first.ordinal
+    if end is not None:
+        end = pd.Timestamp(end)
+        last = end.to_period('M')
+        if end != last.end_time.normalize():
+            edges.append((last.start_time, end))
+            last -= 1
+        mask &= months <= last.ordinal
+    # Both ends partial within one month: that month is a single edge
+    if len(edges) == 2 and edges[0][0].to_period('M') == edges[1][1].to_period('M'):
+        edges = [(start, end)]
+
+    for dim, values in conditions.items():
+        if values is not None:
+            mask &= hist[dim].isin(values).to_numpy()
+    parts = [hist[mask]]
+    for first_day, last_day in edges:
+        rows = edge_rows(first_day.date(), last_day.date())
+        if not rows.empty:
+            parts.append(histogram(rows))
+    # Edge months are never in the selected part, so the cells stay unique
+    hist = pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+    return {'hist': hist, 'cells': _cell_stats(hist, DIMENSIONS)}
+
+
+# Count, sum, mean, std, min and max of price grouped by any subset of the dimensions
+def rollup(cube, by):
+    stats = cube['cells'].groupby(by, observed=True).agg(
+        count=('count', 'sum'),
+        price_sum=('price_sum', 'sum'),
+        price_sumsq=('price_sumsq', 'sum'),
+        price_min=('price_min', 'min'),
+        price_max=('price_max', 'max'),
+    ).reset_index()
+    stats['price_mean'] = stats['price_sum'] / stats['count']
+    variance = (stats['price_sumsq'] - stats['count'] * stats['price_mean'] ** 2) / (stats['count'] - 1)
+    stats['price_std'] = np.sqrt(variance.clip(lower=0))
+    return stats
+
+
+# Price quantiles per group, read off the merged histograms
+def quantiles(cube, by, qs=(0.25, 0.5, 0.75)):
+    hist = cube['hist'].groupby(by + ['price_bin'], observed=True)['n'].sum().reset_index()
+    hist = hist.sort_values(by + ['price_bin'])
+    hist['cum'] = hist.groupby(by, observed=True)['n'].cumsum()
+    hist['total'] = hist.groupby(by, observed=True)['n'].transform('sum')
+
+    result = hist.groupby(by, observed=True).size().reset_index()[by]
+    for q in qs:
+        # First bin whose cumulative count reaches q of the group's rows
+        reached = hist[hist['cum'] >= q * hist['total']]
+        first = reached.groupby(by, observed=True)['price_bin'].first().reset_index(name=f'q{q:g}')
+        result = result.merge(first, on=by)
+        result[f'q{q:g}'] = result[f'q{q:g}'] * PRICE_STEP
+    return result
+
+
+# Box-plot statistics (Tukey whiskers at 1.5 IQR) per group
+def box_stats(cube, by):
+    stats = quantiles(cube, by, (0.25, 0.5, 0.75)).rename(columns={'q0.25': 'q1', 'q0.5': 'median', 'q0.75': 'q3'})
+    hist = cube['hist'].groupby(by + ['price_bin'], observed=True)['n'].sum().reset_index()
+    hist['price'] = hist['price_bin'] * PRICE_STEP
+    hist = hist.merge(stats, on=by)
+
+    iqr = hist['q3'] - hist['q1']
+    inside = hist[(hist['price'] >= hist['q1'] - 1.5 * iqr) & (hist['price'] <= hist['q3'] + 1.5 * iqr)]
+    fences = inside.groupby(by, observed=True)['price'].agg(lowerfence='min', upperfence='max').reset_index()
+    return stats.merge(fences, on=by)
@@ -0,0 +1,276 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import data_store
+
+# Data is partitioned into one model per state and PriceCatcher item category
+SEGMENT_KEY = ['state', 'item_category']
+
+# Folder holding each segment's rows, versioned models and manifest (env-configurable so workers see it)
+SEGMENT_DIR = os.environ.get('SEGMENT_DIR', ".segment_models")
+
+# Segments with fewer rows than this are not trained
+MIN_ROWS = 50
+
+# Model versions kept per segment (older ones are deleted)
+KEEP_VERSIONS = 3
+
+# The shipped model families, fitted with the settings of 3_PREDICTIVE. SVR fits grow quadratically
+# with the rows, so it is trained on a sample of at most this many rows.
+MODELS = ['DT', 'LR', 'RF', 'SVM']
+SVM_MAX_ROWS = 20_000
+
+
+def _slug(value):
+    return re.sub(r'[^a-z0-9]+', '_', str(value).lower()).strip('_')
+
+
+# Folder name of a segment, e.g. "kelantan__telur"
+def segment_id(state, item_category):
+    return f"{_slug(state)}__{_slug(item_category)}"
+
+
+def _segment_dir(segment):
+    return os.path.join(SEGMENT_DIR, segment)
+
+
+def _manifest_path(segment):
+    return os.path.join(_segment_dir(segment), 'manifest.json')
+
+
+# Manifest of a segment (None if it was never trained)
+def load_manifest(segment):
+    path = _manifest_path(segment)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_manifest(segment, manifest):
+    path = _manifest_path(segment)
+    tmp_path = data_store.temp_path(path)
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+# Hash of the rows a segment's models are trained on
+def data_hash(rows):
+    X, y = _training_data(rows)
+    hashed = pd.util.hash_pandas_object(pd.concat([X, y], axis=1), index=False)
+    return hashlib.sha256(hashed.to_numpy().tobytes()).hexdigest()
+
+
+def _training_data(rows):
+    import tune_models
+    return tune_models.load_training_data(rows)
+
+
+def _make_model(name):
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.linear_model import LinearRegression
+    from sklearn.svm import SVR
+    from sklearn.tree import DecisionTreeRegressor
+
+    import tune_models
+
+    regressor = {
+        'DT': lambda: DecisionTreeRegressor(random_state=42),
+        'LR': LinearRegression,
+        'RF': lambda: RandomForestRegressor(random_state=42, n_jobs=1),
+        'SVM': SVR,
+    }[name]()
+    return tune_models.make_pipeline(regressor)
+
+
+# Cap the address space of a worker process, so one oversized segment fails on its own
+# (MemoryError) instead of pushing the whole machine into swap
+def _limit_memory(memory_limit_mb):
+    if memory_limit_mb:
+        import resource
+        limit = memory_limit_mb * 2**20
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+# Fit every model of one segment (runs in a worker process). Reads only the segment's bundle
+# and writes the fitted pipelines to a new version folder.
+def train_segment(segment, version, models=MODELS):
+    import joblib
+    from sklearn.metrics import mean_absolute_error
+    from sklearn.model_selection import train_test_split
+
+    start = time.perf_counter()
+    rows = data_store.read_bundle(os.path.join(_segment_dir(segment), 'data'))
+    X, y = _training_data(rows)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    version_dir = os.path.join(_segment_dir(segment), f"v{version}")
+    tmp_dir = data_store.temp_path(version_dir)
+    os.makedirs(tmp_dir)
+
+    results = {}
+    for name in models:
+        X_fit, y_fit = X_train, y_train
+        if name == 'SVM' and len(X_fit) > SVM_MAX_ROWS:
+            X_fit = X_fit.sample(SVM_MAX_ROWS, random_state=42)
+            y_fit = y_fit.loc[X_fit.index]
+        pipeline = _make_model(name).fit(X_fit, y_fit)
+        file_name = f"{name.lower()}_model_pipeline.pkl"
+        joblib.dump(pipeline, os.path.join(tmp_dir, file_name))
+        results[name] = {
+            'file': file_name,
+            'mae': float(mean_absolute_error(y_test, pipeline.predict(X_test))),
+            'train_rows': len(X_fit),
+        }
+
+    # Left over from a run that was interrupted before it was published
+    shutil.rmtree(version_dir, ignore_errors=True)
+    os.replace(tmp_dir, version_dir)
+    return {'models': results, 'seconds': time.perf_counter() - start}
+
+
+# True if the segment's current version was trained on these rows with all of `models`
+def _up_to_date(segment, digest, models):
+    manifest = load_manifest(segment)
+    if manifest is None:
+        return False
+    current = manifest['versions'][str(manifest['current'])]
+    return current['data_hash'] == digest and set(models) <= set(current['models'])
+
+
+# Write each segment's rows to its own columnar bundle and return the segments whose data
+# changed since their current model version: segment -> (state, item_category, rows, hash)
+def partition(df, models=MODELS, force=False, min_rows=MIN_ROWS, log=print):
+    changed = {}
+    for (state, item_category), rows in df.groupby(SEGMENT_KEY, observed=True):
+        segment = segment_id(state, item_category)
+        if len(rows) < min_rows:
+            log(f"{segment}: skipped ({len(rows)} rows, fewer than {min_rows})")
+            continue
+        rows = rows.reset_index(drop=True)
+        digest = data_hash(rows)
+        if not force and _up_to_date(segment, digest, models):
+            log(f"{segment}: unchanged")
+            continue
+
+        for col in rows.select_dtypes('category').columns:
+            rows[col] = rows[col].cat.remove_unused_categories()
+        data_dir = os.path.join(_segment_dir(segment), 'data')
+        shutil.rmtree(data_dir, ignore_errors=True)
+        os.makedirs(_segment_dir(segment), exist_ok=True)
+        data_store.write_bundle(rows, data_dir, digest)
+        changed[segment] = (str(state), str(item_category), len(rows), digest)
+    return changed
+
+
+# Record a finished version as current and drop versions beyond KEEP_VERSIONS
+def _publish(segment, state, item_category, n_rows, digest, version, result):
+    manifest = load_manifest(segment) or {'state': state, 'item_category': item_category, 'versions': {}}
+    manifest['versions'][str(version)] = {
+        'data_hash': digest,
+        'rows': n_rows,
+        'trained': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        **result,
+    }
+    manifest['current'] = version
+    for old in sorted(manifest['versions'], key=int)[:-KEEP_VERSIONS]:
+        shutil.rmtree(os.path.join(_segment_dir(segment), f"v{old}"), ignore_errors=True)
+        del manifest['versions'][old]
+    _save_manifest(segment, manifest)
+
+
+# Train every segment whose data changed, one segment per task on a process pool.
+# Workers are replaced after each segment so memory from a large fit is returned to the OS.
+def train(source=data_store.SOURCE, models=MODELS, workers=None, memory_limit_mb=None, force=False,
+          min_rows=MIN_ROWS, log=print):
+    start = time.perf_counter()
+    df = data_store.load(source)
+    changed = partition(df, models, force, min_rows, log)
+    del df
+
+    summary = {'trained': [], 'failed': {}, 'seconds': None}
+    if changed:
+        with ProcessPoolExecutor(max_workers=workers, max_tasks_per_child=1, initializer=_limit_memory,
+                                 initargs=(memory_limit_mb,)) as pool:
+            futures = {}
+            for segment in changed:
+                manifest = load_manifest(segment)
+                version = manifest['current'] + 1 if manifest is not None else 1
+                futures[segment] = (version, pool.submit(train_segment, segment, version, models))
+
+            for segment, (version, future) in futures.items():
+                state, item_category, n_rows, digest = changed[segment]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # A failing segment keeps its previous version; the others are still published
+                    summary['failed'][segment] = f"{type(e).__name__}: {e}"
+                    log(f"{segment}: failed - {summary['failed'][segment]}")
+                    continue
+                _publish(segment, state, item_category, n_rows, digest, version, result)
+                summary['trained'].append(segment)
+                maes = ', '.join(f"{name} {info['mae']:.3f}" for name, info in result['models'].items())
+                log(f"{segment}: v{version} trained on {n_rows} rows in {result['seconds']:.1f}s (MAE {maes})")
+
+    summary['seconds'] = time.perf_counter() - start
+    return summary
+
+
+# Segments with a trained model: segment -> manifest (for the prediction pages)
+def segments(name=None):
+    if not os.path.isdir(SEGMENT_DIR):
+        return {}
+    result = {}
+    for segment in sorted(os.listdir(SEGMENT_DIR)):
+        manifest = load_manifest(segment)
+        if manifest is None:
+            continue
+        current = manifest['versions'][str(manifest['current'])]
+        if name is None or name in current['models']:
+            result[segment] = manifest
+    return result
+
+
+# Item code -> item name in a segment's data (the shipped Kelantan egg data for segment None)
+def item_names(segment=None):
+    columns = ['item_code', 'item']
+    if segment is None:
+        rows = data_store.load(columns=columns)
+    else:
+        rows = data_store.read_bundle(os.path.join(_segment_dir(segment), 'data'), columns)
+    items = rows.drop_duplicates('item_code').sort_values('item_code')
+    return dict(zip(items['item_code'].tolist(), items['item'].astype(str)))
+
+
+# Pickle of the current version of a segment's model
+def model_path(segment, name):
+    manifest = load_manifest(segment)
+    if manifest is None:
+        raise ValueError(f"No trained models for segment '{segment}'")
+    version = manifest['current']
+    return os.path.join(_segment_dir(segment), f"v{version}", manifest['versions'][str(version)]['models'][name]['file'])
+
+
+# Example (nightly, on a multi-state extract):
+#   python segment_training.py --source pricecatcher_all.csv --workers 4 --memory-limit 4096
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train one set of models per (state, item category) segment")
+    parser.add_argument('--source', default=data_store.SOURCE)
+    parser.add_argument('--models', nargs='+', default=MODELS, choices=MODELS)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--memory-limit', type=int, default=None, help="address-space cap per worker, in MB")
+    parser.add_argument('--min-rows', type=int, default=MIN_ROWS)
+    parser.add_argument('--force', action='store_true', help="retrain segments whose data is unchanged")
+    args = parser.parse_args()
+
+    result = train(args.source, args.models, args.workers, args.memory_limit, args.force, args.min_rows)
+    print(f"{len(result['trained'])} segments trained, {len(result['failed'])} failed in {result['seconds']:.1f}s")
@@ -0,0 +1,243 @@
+import argparse
+import glob
+import html
+import json
+import os
+import shutil
+import time
+
+import pandas as pd
+
+import data_store
+import model_registry
+import prediction_table
+import price_panel
+import state_data
+
+# Where the static bundle is served from (serve it as plain files): a symlink to the latest build
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR', "snapshot")
+
+# Pages exported, in navigation order: (script, output file, navigation label)
+PAGES = [
+    ('main.py', 'index.html', 'Home'),
+    ('pages/1_DESCRIPTIVE.py', 'descriptive.html', 'Descriptive'),
+    ('pages/2_DIAGNOSTIC.py', 'diagnostic.html', 'Diagnostic'),
+    ('pages/3_PREDICTIVE.py', 'predictive.html', 'Predictive'),
+]
+
+# Seconds a page may take to run headlessly (3_PREDICTIVE trains its models on a cold cache)
+PAGE_TIMEOUT = 600
+
+_MANIFEST = 'manifest.json'
+
+
+# Everything the bundle depends on: data files, model pickles, the page scripts and the app's own
+# modules they import (chart_data, rollup_cube, figure_cache, ...)
+def versions():
+    sources = {data_store.SOURCE} | {spec[0] for spec in state_data.SUMMARIES.values()}
+    sources |= {spec[0] for spec in price_panel.JOINS.values()}
+    result = {f'data:{source}': data_store.data_version(source) for source in sorted(sources)}
+    result.update({f'model:{name}': prediction_table.pipeline_version(name) for name in model_registry.MODEL_FILES})
+    result.update({f'page:{script}': data_store.data_version(script) for script, _, _ in PAGES})
+    scripts = {script for script, _, _ in PAGES}
+    modules = sorted(path for path in glob.glob('*.py') if path not in scripts)
+    result.update({f'module:{path}': data_store.data_version(path) for path in modules})
+    return result
+
+
+# Manifest of the current bundle (None if there is none)
+def load_manifest(snapshot_dir=SNAPSHOT_DIR):
+    path = os.path.join(snapshot_dir, _MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+# Elements of a headless page run in display order (sidebar widgets are left out)
+def _elements(node):
+    for child in getattr(node, 'children', {}).values():
+        if getattr(child, 'type', None) in ('title', 'header', 'subheader', 'markdown', 'caption',
+                                            'plotly_chart', 'dataframe', 'table', 'error', 'warning', 'info'):
+            yield child
+        else:
+            yield from _elements(child)
+
+
+# Run a page script headlessly and collect its text, figures (Plotly JSON) and tables
+def run_page(script, timeout=PAGE_TIMEOUT):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.abspath(script), default_timeout=timeout).run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+
+    content = []
+    for element in _elements(at.main):
+        if element.type == 'plotly_chart':
+            content.append(('figure', json.loads(element.proto.spec)))
+        elif element.type in ('dataframe', 'table'):
+            content.append(('table', element.value))
+        else:
+            content.append((element.type, element.value))
+    return content
+
+
+# Full predicted-price grid of a pipeline, one row per (item_code, premise_type, district, month)
+def prediction_grid(name):
+    table = prediction_table.load_table(name)
+    if table is None:
+        prediction_table.compile_table(name)
+        table = prediction_table.load_table(name)
+    values, _ = table
+    index = pd.MultiIndex.from_product(
+        list(model_registry.get_categories(name)) + [prediction_table.MONTHS],
+        names=['item_code', 'premise_type', 'district', 'month']
+    )
+    return pd.DataFrame({'price': values.ravel()}, index=index).reset_index()
+
+
+_STYLE = """
+body { font-family: sans-serif; max-width: 1100px; margin: auto; padding: 1em; }
+nav a { margin-right: 1em; }
+.markdown { white-space: pre-wrap; }
+.caption { color: #777; font-size: 0.9em; }
+.error, .warning, .info { padding: 0.5em; border-radius: 4px; background: #f4f4f4; }
+table { border-collapse: collapse; font-size: 0.85em; } td, th { border: 1px solid #ddd; padding: 2px 6px; }
+"""
+
+
+def _render(title, content, nav, page_id):
+    parts = []
+    for kind, value in content:
+        if kind == 'figure':
+            figure_id = f'{page_id}-figure-{len(parts)}'
+            # "</" would end the inline script early
+            spec = json.dumps(value).replace('</', '<\\/')
+            parts.append(f'<div id="{figure_id}"></div><script>(function () {{ var fig = {spec}; '
+                         f'Plotly.newPlot("{figure_id}", fig.data, fig.layout); }})();</script>')
+        elif kind == 'table':
+            parts.append(value.to_html(index=False, border=0, max_rows=500))
+        elif kind in ('title', 'header', 'subheader'):
+            tag = {'title': 'h1', 'header': 'h2', 'subheader': 'h3'}[kind]
+            parts.append(f'<{tag}>{html.escape(str(value))}</{tag}>')
+        else:
+            parts.append(f'<div class="{kind}">{html.escape(str(value))}</div>')
+    return (f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>{html.escape(title)}</title>'
+            f'<script src="plotly.min.js"></script><style>{_STYLE}</style></head>'
+            f'<body><nav>{nav}</nav>{"".join(parts)}</body></html>')
+
+
+def _write_json(path, value):
+    with open(path, 'w') as f:
+        json.dump(value, f, default=str)
+
+
+# Write the whole bundle to a temporary folder, then swap it in place of the old one
+def build(snapshot_dir=SNAPSHOT_DIR, log=print):
+    import plotly
+
+    start = time.perf_counter()
+    current = versions()
+    # Each build gets its own folder; snapshot_dir is a symlink to the current one
+    tmp_dir = f"{snapshot_dir}.v{time.strftime('%Y%m%d%H%M%S')}-{os.getpid()}"
+    for folder in ('figures', 'tables', 'predictions'):
+        os.makedirs(os.path.join(tmp_dir, folder))
+    shutil.copy(os.path.join(os.path.dirname(plotly.__file__), 'package_data', 'plotly.min.js'), tmp_dir)
+
+    manifest = {'versions': current, 'built': time.strftime('%Y-%m-%dT%H:%M:%S'), 'pages': {}, 'predictions': {}}
+    nav = ''.join(f'<a href="{output}">{label}</a>' for _, output, label in PAGES)
+    nav += '<a href="predictions.html">Predictions</a>'
+
+    for script, output, label in PAGES:
+        page_id = os.path.splitext(output)[0]
+        try:
+            content = run_page(script)
+        except Exception as e:
+            # A failing page is left out of the bundle; the others are still exported
+            manifest['pages'][output] = {'script': script, 'error': str(e)}
+            log(f"{script}: failed - {e}")
+            content = [('title', label), ('error', f"This page could not be exported: {e}")]
+        else:
+            figures = [value for kind, value in content if kind == 'figure']
+            tables = [value for kind, value in content if kind == 'table']
+            for i, figure in enumerate(figures):
+                _write_json(os.path.join(tmp_dir, 'figures', f'{page_id}_{i}.json'), figure)
+            for i, table in enumerate(tables):
+                table.to_csv(os.path.join(tmp_dir, 'tables', f'{page_id}_{i}.csv'), index=False)
+            manifest['pages'][output] = {'script': script, 'figures': len(figures), 'tables': len(tables)}
+            log(f"{script}: {len(figures)} figures, {len(tables)} tables")
+        title = next((value for kind, value in content if kind == 'title'), label)
+        with open(os.path.join(tmp_dir, output), 'w', encoding='utf-8') as f:
+            f.write(_render(title, content, nav, page_id))
+
+    # Prediction grids replace the PREDICT APP forms: every input combination, precomputed
+    grids = []
+    for name in model_registry.MODEL_FILES:
+        grid = prediction_grid(name)
+        path = os.path.join('predictions', f'{name.lower()}_grid.csv')
+        grid.to_csv(os.path.join(tmp_dir, path), index=False)
+        manifest['predictions'][name] = {'file': path, 'rows': len(grid)}
+        grids.append(('subheader', f"{name} model"))
+        grids.append(('markdown', f"Full grid: {path} ({len(grid)} rows)"))
+        grids.append(('table', grid))
+    with open(os.path.join(tmp_dir, 'predictions.html'), 'w', encoding='utf-8') as f:
+        f.write(_render('Predicted Egg Prices', [('title', 'Predicted Egg Prices')] + grids, nav, 'predictions'))
+
+    manifest['seconds'] = time.perf_counter() - start
+    # The manifest is written last and marks the bundle as complete
+    _write_json(os.path.join(tmp_dir, _MANIFEST), manifest)
+
+    _publish(snapshot_dir, tmp_dir)
+    return manifest
+
+
+# Point the snapshot_dir symlink at a finished build. os.replace swaps the link in one step, so the
+# bundle is never missing; the previous build is kept for readers still serving from it.
+def _publish(snapshot_dir, build_dir):
+    previous = os.path.realpath(snapshot_dir) if os.path.islink(snapshot_dir) else None
+    if os.path.isdir(snapshot_dir) and previous is None:
+        # Bundle written by an older version of this script as a plain folder
+        previous = f"{snapshot_dir}.v0"
+        shutil.rmtree(previous, ignore_errors=True)
+        os.replace(snapshot_dir, previous)
+
+    link = data_store.temp_path(snapshot_dir)
+    os.symlink(os.path.basename(build_dir), link)
+    os.replace(link, snapshot_dir)
+
+    keep = {os.path.realpath(build_dir), previous}
+    for folder in glob.glob(f"{glob.escape(snapshot_dir)}.v*"):
+        if os.path.realpath(folder) not in keep:
+            shutil.rmtree(folder, ignore_errors=True)
+
+
+# True if the bundle was built from the current data, models, pages and modules
+def up_to_date(snapshot_dir=SNAPSHOT_DIR):
+    manifest = load_manifest(snapshot_dir)
+    return manifest is not None and manifest['versions'] == versions()
+
+
+# Rebuild the bundle only if the data, a model, a page or a module changed since it was built
+def export(snapshot_dir=SNAPSHOT_DIR, force=False, log=print):
+    if not force and up_to_date(snapshot_dir):
+        manifest = load_manifest(snapshot_dir)
+        log(f"Snapshot in {snapshot_dir} is up to date (built {manifest['built']})")
+        return manifest
+    return build(snapshot_dir, log)
+
+
+# Example (after ingest or a model update): python snapshot.py && serve snapshot/ as static files
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the dashboard as a static bundle of HTML, JSON and CSV")
+    parser.add_argument('--output', default=SNAPSHOT_DIR)
+    parser.add_argument('--force', action='store_true', help="rebuild even if nothing changed")
+    args = parser.parse_args()
+
+    if not args.force and up_to_date(args.output):
+        print(f"Snapshot in {args.output} is up to date (built {load_manifest(args.output)['built']}), skipped")
+    else:
+        result = build(args.output)
+        failed = [output for output, page in result['pages'].items() if 'error' in page]
+        print(f"Snapshot written to {args.output} in {result['seconds']:.1f}s"
+              + (f" ({len(failed)} pages failed: {', '.join(failed)})" if failed else ""))
@@ -0,0 +1,104 @@
+import os
+import shutil
+import threading
+
+import pandas as pd
+
+import data_store
+
+# Year-level summaries precomputed for every state: name -> (source, group columns, value columns, aggregation)
+SUMMARIES = {
+    'ethnicity_by_year': ('population_state.csv', ['ethnicity'], ['population'], 'sum'),
+    'income_by_year': ('hh_income_state.csv', [], ['income_mean', 'income_median'], 'mean'),
+    'district_by_year': ('population_district.csv', ['district'], ['population'], 'sum'),
+}
+
+# Partitions already checked in this process: source -> fingerprint
+_checked = {}
+
+# Serializes partitioning: sessions and the warm-up thread share one process
+_lock = threading.Lock()
+
+
+def _dataset_dir(source):
+    name = os.path.splitext(os.path.basename(source))[0]
+    return os.path.join(data_store.STORE_DIR, f"{name}_by_state")
+
+
+def _state_dir(source, fingerprint, state):
+    return os.path.join(_dataset_dir(source), fingerprint, f"state={state}")
+
+
+# Year-level group-by for one state's rows
+def summarise(rows, by, values, agg):
+    grouped = rows.groupby(by + [rows['date'].dt.year.rename('year')], observed=True)[values]
+    return getattr(grouped, agg)().reset_index()
+
+
+# Parse `source` once and write one columnar bundle (plus its summaries) per state
+def build_partitions(source, fingerprint):
+    df = pd.read_csv(source)
+    df['date'] = pd.to_datetime(df['date'], errors='coerce')
+    df = df.dropna(subset=['date'])
+    for col in df.columns:
+        if pd.api.types.is_object_dtype(df[col]) or pd.api.types.is_string_dtype(df[col]):
+            df[col] = df[col].astype('category')
+
+    summaries = {name: spec for name, spec in SUMMARIES.items() if spec[0] == source}
+    for state, rows in df.groupby('state', observed=True):
+        state_dir = _state_dir(source, fingerprint, state)
+        rows = rows.reset_index(drop=True)
+        for col in rows.select_dtypes('category').columns:
+            rows[col] = rows[col].cat.remove_unused_categories()
+        data_store.write_bundle(rows, os.path.join(state_dir, 'rows'), fingerprint)
+        for name, (_, by, values, agg) in summaries.items():
+            summarise(rows, by, values, agg).to_pickle(os.path.join(state_dir, f"{name}.pkl"))
+
+    # Marks the partitioning of this version as complete
+    open(os.path.join(_dataset_dir(source), fingerprint, '_SUCCESS'), 'w').close()
+
+
+# Make sure per-state partitions exist for the current version of `source`; returns its fingerprint
+def ensure_partitions(source):
+    fingerprint = data_store.source_fingerprint(source)
+    if _checked.get(source) == fingerprint:
+        return fingerprint
+
+    dataset_dir = _dataset_dir(source)
+    with _lock:
+        # Checked again under the lock: another thread may have just built it
+        if not os.path.exists(os.path.join(dataset_dir, fingerprint, '_SUCCESS')):
+            build_partitions(source, fingerprint)
+            # Drop partitions built from older versions of the source
+            for old in os.listdir(dataset_dir):
+                if old != fingerprint:
+                    shutil.rmtree(os.path.join(dataset_dir, old), ignore_errors=True)
+
+    _checked[source] = fingerprint
+    return fingerprint
+
+
+# Rows of `source` for one state only; other states' partitions are never read
+def load_state(source, state, columns=None):
+    fingerprint = ensure_partitions(source)
+    rows_dir = os.path.join(_state_dir(source, fingerprint, state), 'rows')
+    if not os.path.exists(rows_dir):
+        raise ValueError(f"No rows for state '{state}' in {source}")
+    return data_store.read_bundle(rows_dir, columns)
+
+
+# A precomputed year-level summary (see SUMMARIES) for one state
+def load_summary(name, state):
+    source = SUMMARIES[name][0]
+    fingerprint = ensure_partitions(source)
+    path = os.path.join(_state_dir(source, fingerprint, state), f"{name}.pkl")
+    if not os.path.exists(path):
+        raise ValueError(f"No rows for state '{state}' in {source}")
+    return pd.read_pickle(path)
+
+
+# States available in a dataset
+def states(source):
+    fingerprint = ensure_partitions(source)
+    base = os.path.join(_dataset_dir(source), fingerprint)
+    return sorted(name[len('state='):] for name in os.listdir(base) if name.startswith('state='))
@@ -0,0 +1,268 @@
+import argparse
+import glob
+import hashlib
+import json
+import math
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.linear_model import LinearRegression
+from sklearn.metrics import mean_absolute_error
+from sklearn.model_selection import KFold, ParameterSampler
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder
+from sklearn.svm import SVR
+from sklearn.tree import DecisionTreeRegressor
+
+import data_store
+import model_registry
+
+CATEGORICAL_FEATURES = ['item_code', 'premise_type', 'district']
+FEATURES = ['item_code', 'premise_type', 'district', 'month']
+
+# Folder for finished trials and partially grown forests, so an interrupted search resumes
+TUNING_DIR = os.environ.get('TUNING_DIR', ".tuning")
+
+# Search space per model. The resource is what successive halving grows between rungs:
+# 'n_estimators' grows a warm-started forest, 'samples' grows the share of training rows.
+SEARCH_SPACES = {
+    'RF': {
+        'estimator': RandomForestRegressor(random_state=42, n_jobs=1),
+        'params': {
+            'max_depth': [None, 4, 8, 16],
+            'min_samples_leaf': [1, 2, 4, 8],
+            'max_features': [1.0, 0.5, 'sqrt'],
+        },
+        'resource': 'n_estimators',
+        'min_resource': 10,
+        'max_resource': 270,
+    },
+    'DT': {
+        'estimator': DecisionTreeRegressor(random_state=42),
+        'params': {
+            'max_depth': [None, 2, 4, 6, 8, 12],
+            'min_samples_leaf': [1, 2, 4, 8, 16],
+            'criterion': ['squared_error', 'absolute_error'],
+        },
+        'resource': 'samples',
+        'min_resource': 1,
+        'max_resource': 27,
+    },
+    'LR': {
+        'estimator': LinearRegression(),
+        'params': {
+            'fit_intercept': [True, False],
+            'positive': [False, True],
+        },
+        'resource': 'samples',
+        'min_resource': 1,
+        'max_resource': 27,
+    },
+    'SVM': {
+        'estimator': SVR(),
+        'params': {
+            'C': [0.1, 0.3, 1, 3, 10, 30],
+            'epsilon': [0.01, 0.05, 0.1, 0.2],
+            'gamma': ['scale', 0.01, 0.1, 1],
+        },
+        'resource': 'samples',
+        'min_resource': 1,
+        'max_resource': 27,
+    },
+}
+
+
+# Same pipeline layout as the shipped *_model_pipeline.pkl files
+def make_pipeline(regressor):
+    preprocessor = ColumnTransformer(
+        transformers=[('cat', OneHotEncoder(drop='first', handle_unknown='ignore', sparse_output=False),
+                       CATEGORICAL_FEATURES)],
+        remainder='passthrough'
+    )
+    return Pipeline(steps=[('preprocessor', preprocessor), ('regressor', regressor)])
+
+
+# Model inputs and target, with the raw category values the PREDICT APP pages use
+def load_training_data(df=None):
+    df = data_store.load() if df is None else df
+    X = pd.DataFrame({
+        'item_code': df['item_code'].astype('int64'),
+        'premise_type': df['premise_type'].astype(str),
+        'district': df['district'].astype(str),
+        'month': df['date'].dt.month,
+    })
+    return X, df['price'].astype(float)
+
+
+# Fingerprint of the training rows and the CV split, so trials scored on older data are not reused
+def data_key(X, y, n_splits=3):
+    hashed = pd.util.hash_pandas_object(pd.concat([X, y], axis=1), index=False).to_numpy()
+    text = json.dumps([hashlib.sha256(hashed.tobytes()).hexdigest(), n_splits, 'kfold-shuffle-42'])
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+def _trial_key(name, params, data):
+    text = json.dumps([name, params, data], sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+def _trial_path(name, key):
+    return os.path.join(TUNING_DIR, name, f"{key}.json")
+
+
+def _forest_path(name, key, fold):
+    return os.path.join(TUNING_DIR, name, f"{key}_fold{fold}.joblib")
+
+
+# Delete the partially grown forests of a trial that will not be grown further
+def _drop_forests(name, key):
+    for path in glob.glob(os.path.join(TUNING_DIR, name, f"{key}_fold*.joblib")):
+        os.remove(path)
+
+
+def _read_trial(name, key):
+    path = _trial_path(name, key)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+# Cross-validated MAE of one configuration at one resource level (runs in a worker process).
+# Finished scores are stored per trial, so a rerun of the same search skips them.
+def evaluate_trial(name, params, resource, X, y, data, n_splits=3):
+    space = SEARCH_SPACES[name]
+    key = _trial_key(name, params, data)
+    record = _read_trial(name, key) or {'params': params, 'scores': {}}
+    if str(resource) in record['scores']:
+        return key, record['scores'][str(resource)]
+
+    start = time.perf_counter()
+    errors = []
+    for fold, (train_idx, test_idx) in enumerate(KFold(n_splits, shuffle=True, random_state=42).split(X)):
+        if space['resource'] == 'n_estimators':
+            # Grow the forest stored at the previous rung instead of refitting it from scratch
+            forest_path = _forest_path(name, key, fold)
+            if os.path.exists(forest_path):
+                pipeline = joblib.load(forest_path)
+            else:
+                pipeline = make_pipeline(clone(space['estimator']).set_params(**params, warm_start=True))
+            pipeline.set_params(regressor__n_estimators=resource)
+            pipeline.fit(X.iloc[train_idx], y.iloc[train_idx])
+            joblib.dump(pipeline, forest_path)
+        else:
+            # Train on a growing share of the fold's training rows
+            share = resource / space['max_resource']
+            rng = np.random.default_rng(fold)
+            subset = rng.permutation(train_idx)[:max(int(len(train_idx) * share), 10)]
+            pipeline = make_pipeline(clone(space['estimator']).set_params(**params))
+            pipeline.fit(X.iloc[subset], y.iloc[subset])
+        errors.append(mean_absolute_error(y.iloc[test_idx], pipeline.predict(X.iloc[test_idx])))
+
+    record['scores'][str(resource)] = float(np.mean(errors))
+    record.setdefault('seconds', {})[str(resource)] = time.perf_counter() - start
+    tmp_path = data_store.temp_path(_trial_path(name, key))
+    with open(tmp_path, 'w') as f:
+        json.dump(record, f, default=str)
+    os.replace(tmp_path, _trial_path(name, key))
+    return key, record['scores'][str(resource)]
+
+
+# One successive-halving bracket: score n configurations at the lowest resource, keep the
+# best 1/eta of them, multiply the resource by eta, and repeat until the maximum resource.
+def successive_halving(name, configs, min_resource, X, y, data, eta=3, n_jobs=-1, log=print):
+    max_resource = SEARCH_SPACES[name]['max_resource']
+    resource = min_resource
+    survivors = configs
+    results = []
+    while survivors:
+        scores = Parallel(n_jobs=n_jobs, backend='loky')(
+            delayed(evaluate_trial)(name, params, resource, X, y, data) for params in survivors
+        )
+        rung = sorted(zip(survivors, (score for _, score in scores)), key=lambda item: item[1])
+        results.append({'resource': resource, 'scores': rung})
+        log(f"{name}: {len(survivors)} configs at {SEARCH_SPACES[name]['resource']}={resource}, best MAE {rung[0][1]:.4f}")
+        if resource >= max_resource:
+            # Forests at the maximum resource are never grown further
+            for params, _ in rung:
+                _drop_forests(name, _trial_key(name, params, data))
+            break
+        keep = max(len(rung) // eta, 1)
+        # Eliminated trials are not grown again in this bracket
+        for params, _ in rung[keep:]:
+            _drop_forests(name, _trial_key(name, params, data))
+        survivors = [params for params, _ in rung[:keep]]
+        resource = min(resource * eta, max_resource)
+    return results
+
+
+# Hyperband: several successive-halving brackets trading off many cheap trials
+# against few fully trained ones. Returns the best (params, MAE) at the maximum resource.
+def hyperband(name, X, y, eta=3, n_jobs=-1, random_state=42, log=print):
+    space = SEARCH_SPACES[name]
+    os.makedirs(os.path.join(TUNING_DIR, name), exist_ok=True)
+    s_max = int(math.log(space['max_resource'] / space['min_resource'], eta) + 1e-9)
+    data = data_key(X, y)
+
+    best = None
+    for s in range(s_max, -1, -1):
+        n_configs = int(math.ceil((s_max + 1) / (s + 1) * eta ** s))
+        min_resource = max(int(space['max_resource'] * eta ** -s), space['min_resource'])
+        configs = list(ParameterSampler(space['params'], n_iter=n_configs, random_state=random_state + s))
+        # Small grids can produce the same configuration twice
+        configs = list({_trial_key(name, params, data): params for params in configs}.values())
+
+        rungs = successive_halving(name, configs, min_resource, X, y, data, eta, n_jobs, log)
+        params, score = rungs[-1]['scores'][0]
+        if rungs[-1]['resource'] == space['max_resource'] and (best is None or score < best[1]):
+            best = (params, score)
+    return best
+
+
+# Refit the winning configuration on all rows and save it like the shipped pipelines
+def export(name, params, X, y, path, score=None):
+    space = SEARCH_SPACES[name]
+    regressor = clone(space['estimator']).set_params(**params)
+    if space['resource'] == 'n_estimators':
+        regressor.set_params(n_estimators=space['max_resource'])
+    pipeline = make_pipeline(regressor)
+    pipeline.fit(X, y)
+    joblib.dump(pipeline, path)
+
+    # Installed over a shipped pipeline: it now covers every month ingest flagged for it
+    if path == model_registry.MODEL_FILES[name]:
+        import ingest
+        ingest.clear_refit(name)
+
+    # Keep a record of how the pipeline was tuned next to the trials
+    with open(os.path.join(TUNING_DIR, name, 'best.json'), 'w') as f:
+        json.dump({'params': params, 'cv_mae': score, 'pipeline': path, 'rows': len(X)}, f, indent=2, default=str)
+    return pipeline
+
+
+# Example: python tune_models.py RF SVM --install
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tune the price models with Hyperband / successive halving")
+    parser.add_argument('models', nargs='*', default=list(SEARCH_SPACES), help="Models to tune (RF, DT, LR, SVM)")
+    parser.add_argument('--eta', type=int, default=3)
+    parser.add_argument('--jobs', type=int, default=-1)
+    parser.add_argument('--install', action='store_true',
+                        help="Overwrite the pipeline files loaded by the PREDICT APP pages")
+    args = parser.parse_args()
+
+    X, y = load_training_data()
+    for model_name in args.models:
+        best_params, best_score = hyperband(model_name, X, y, eta=args.eta, n_jobs=args.jobs)
+        if args.install:
+            output = model_registry.MODEL_FILES[model_name]
+        else:
+            output = os.path.join(TUNING_DIR, model_name, f"{model_name.lower()}_model_pipeline.pkl")
+        export(model_name, best_params, X, y, output, best_score)
+        print(f"{model_name}: best MAE {best_score:.4f} with {best_params} -> {output}")
@@ -0,0 +1,143 @@
+import importlib
+import os
+import threading
+import time
+
+import perf
+
+# Modules the pages import on first use, heaviest first
+HEAVY_MODULES = [
+    'sklearn.ensemble', 'sklearn.svm', 'sklearn.tree', 'sklearn.linear_model', 'sklearn.model_selection',
+    'sklearn.preprocessing', 'sklearn.metrics', 'scipy.stats', 'pandas', 'plotly.express', 'plotly.graph_objects',
+]
+
+# Progress of the warm-up in this process, read by indicator() and ready()
+status = {'state': 'idle', 'step': None, 'done': 0, 'total': 0, 'errors': {}, 'seconds': None}
+
+_lock = threading.Lock()
+_thread = None
+
+
+def _import_modules():
+    for name in HEAVY_MODULES:
+        importlib.import_module(name)
+
+
+def _load_data():
+    import data_store
+    data_store.load()
+
+
+def _build_features():
+    import feature_store
+    feature_store.update()
+
+
+def _score_anomalies():
+    import anomaly_detector
+    anomaly_detector.catch_up()
+
+
+def _build_panel():
+    import price_panel
+    price_panel.update()
+
+
+def _partition_state_data():
+    import state_data
+    for source in sorted({spec[0] for spec in state_data.SUMMARIES.values()}):
+        if os.path.exists(source):
+            state_data.ensure_partitions(source)
+
+
+# The descriptive page's data, cube and charts for its default (unfiltered) view
+def _build_descriptive():
+    import data_store
+    import descriptive_data
+    import filter_index
+
+    version = data_store.data_version()
+    index = descriptive_data.load_index(version)
+    start, end = filter_index.date_bounds(index)
+    cube = descriptive_data.cube_for(version, index, start, end, [], [], [])
+    for _ in descriptive_data.figures(version, cube, start, end, [], [], []):
+        pass
+
+
+def _load_models():
+    import compiled_model
+    import model_registry
+    import prediction_table
+    for name in model_registry.MODEL_FILES:
+        model_registry.get_pipeline(name)
+        if prediction_table.load_table(name) is None:
+            prediction_table.compile_table(name)
+        compiled_model.load(name)
+
+
+# (label, function) in the order they run; a failing step is recorded and the rest still run
+STEPS = [
+    ('Importing libraries', _import_modules),
+    ('Loading price data', _load_data),
+    ('Building descriptive charts', _build_descriptive),
+    ('Building price-history features', _build_features),
+    ('Scoring new prices for anomalies', _score_anomalies),
+    ('Partitioning population and income data', _partition_state_data),
+    ('Joining prices with population and income', _build_panel),
+    ('Loading models and prediction tables', _load_models),
+]
+
+
+# Run every step in the calling thread
+def run(log=None):
+    start = time.perf_counter()
+    status.update(state='running', done=0, total=len(STEPS), errors={})
+    for label, step in STEPS:
+        status['step'] = label
+        try:
+            with perf.span('load', f"warmup: {label}"):
+                step()
+        except Exception as e:
+            status['errors'][label] = str(e)
+        status['done'] += 1
+        if log is not None:
+            log(f"{label}: {'failed - ' + status['errors'][label] if label in status['errors'] else 'done'}")
+    status.update(state='ready', step=None, seconds=time.perf_counter() - start)
+    return status
+
+
+# Start the warm-up in a background thread, once per process. Every page calls this, so a deep link
+# to a page warms the caches as well as a visit to the home page.
+def start():
+    global _thread
+    with _lock:
+        if _thread is None:
+            _thread = threading.Thread(target=run, name='cache-warmup', daemon=True)
+            _thread.start()
+    return _thread
+
+
+def ready():
+    return status['state'] == 'ready'
+
+
+# Readiness indicator in the sidebar
+def indicator():
+    import streamlit as st
+
+    if ready():
+        if status['errors']:
+            st.sidebar.warning("Warm-up finished with errors: " + "; ".join(
+                f"{label}: {error}" for label, error in status['errors'].items()))
+        else:
+            st.sidebar.success(f"✅ Ready (caches warmed in {status['seconds']:.1f}s)")
+    else:
+        total = max(status['total'], len(STEPS))
+        st.sidebar.progress(status['done'] / total,
+                            text=f"⏳ Warming up ({status['done']}/{total}): {status['step'] or 'starting'}")
+
+
+# Pre-build the on-disk caches during a deploy, before the app starts: python warmup.py
+if __name__ == "__main__":
+    result = run(log=print)
+    print(f"Warm-up finished in {result['seconds']:.1f}s with {len(result['errors'])} errors")